@@ -0,0 +1,219 @@
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+# path hack to allow importing pattern (as in the notebooks)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../externals")))
+
+import clingo
+import numpy as np
+import torch
+from benchmark.synthetic import OPERATOR_MIXES, make_vocabulary, make_questions, make_detections, SyntheticImageLoader, SyntheticObjectDetector, add_synthetic_probs
+from object_detection.box_merging import CategoryIndex, merge_overlapping_objects
+from object_detection.detections import LabelVocabulary
+from pipeline.bounding_box_optimization import get_pair_bboxes
+from pipeline.encoding import encode_question
+from pipeline.encoding.perfect_information_encoding import encode_scene as encode_perfect_scene, get_metadata_lookups
+from pipeline.encoding.scene_encoding import prepare_scene, build_scene_program, merge_detected_objects
+from pipeline.solving import SolverSession
+from pipeline.utils import sanitize_asp
+
+
+# nltk corpora that pattern (used by sanitize_asp) needs, it downloads them on its first import if they are missing
+PATTERN_CORPORA = ["wordnet", "wordnet_ic", "sentiwordnet"]
+
+
+def check_pattern_corpora():
+    # the benchmark has to run without network, so the corpora have to be installed beforehand
+    import nltk
+
+    missing = []
+    for corpus in PATTERN_CORPORA:
+        try:
+            nltk.data.find(f"corpora/{corpus}")
+        except LookupError:
+            missing.append(corpus)
+    if len(missing) > 0:
+        raise RuntimeError(f"The nltk corpora {', '.join(missing)} are missing, install them once with network access: python -m nltk.downloader {' '.join(missing)}!")
+
+
+def time_inputs(fn, inputs, repeats):
+    # seconds per input of fn, for every repeat over all inputs after one warm-up pass, without garbage collection
+    # in between (like timeit)
+    for x in inputs:
+        fn(x)
+
+    times = []
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for x in inputs:
+                fn(x)
+            times.append((time.perf_counter() - start) / len(inputs))
+    finally:
+        gc.enable()
+    return times
+
+
+def summarize_times(times):
+    times = np.array(times, dtype=np.float64)
+    return {
+        "repeats": len(times),
+        "mean_sec": float(times.mean()),
+        "p50_sec": float(np.percentile(times, 50)),
+        "min_sec": float(times.min()),
+        "max_sec": float(times.max())
+    }
+
+
+def get_scene_strings(question):
+    # every name, attribute value and relation of the scene graph, as they go through sanitize_asp when it is encoded
+    objects = question["sceneGraph"]["objects"].values()
+    return [o["name"] for o in objects] + [v for o in objects for v in o["attributes"]] + [r["name"] for o in objects for r in o["relations"]]
+
+
+def run_cell(num_objects, operator_mix, vocabulary, session, args):
+    # the inputs of a cell only depend on the seed, so that the same cell of runs with different grids is comparable
+    rng = np.random.default_rng([args.seed, num_objects, list(OPERATOR_MIXES.keys()).index(operator_mix)])
+    all_classes, all_attributes = vocabulary["all_classes"], vocabulary["all_attributes"]
+    all_child_classes = [c.replace("_", " ") for c in itertools.chain(*all_classes.values())]
+    lookups = get_metadata_lookups(all_classes, all_attributes)
+    category_index = CategoryIndex(all_classes)
+
+    questions = make_questions(args.questions_per_cell, num_objects, operator_mix, vocabulary, rng)
+    label_vocabulary = LabelVocabulary()
+    detections = [make_detections(q["sceneGraph"], label_vocabulary, rng) for q in questions]
+    # a second, fully duplicated detection set per scene, like the detections of another class query
+    duplicate_detections = [make_detections(q["sceneGraph"], label_vocabulary, rng, duplicate_rate=1.0) for q in questions]
+
+    object_detector = SyntheticObjectDetector(questions, seed=args.seed)
+    image_loader = SyntheticImageLoader(questions)
+    scenes = [
+        add_synthetic_probs(prepare_scene(q, object_detector, all_classes, all_child_classes, all_attributes, None, image_loader, args.lazy_perception), rng)
+        for q in questions
+    ]
+    programs = [build_scene_program(scene, all_classes, all_attributes) for scene in scenes]
+
+    timings = {
+        "encode_question": time_inputs(lambda q: encode_question(q, as_program=True), questions, args.repeats),
+        "perfect_information_encode_scene": time_inputs(lambda q: encode_perfect_scene(q["sceneGraph"], lookups), questions, args.repeats),
+        "sanitize_asp": time_inputs(lambda q: [sanitize_asp(s) for s in get_scene_strings(q)], questions, args.repeats),
+        "get_pair_bboxes": time_inputs(lambda d: get_pair_bboxes(d, merge_threshold=0.6), detections, args.repeats),
+        "merge_overlapping_objects": time_inputs(lambda d: merge_overlapping_objects(d, 0.6), detections, args.repeats),
+        "merge_detected_objects": time_inputs(lambda d: merge_detected_objects(d[0], d[1], all_classes, category_index), list(zip(detections, duplicate_detections)), args.repeats),
+        "prepare_scene": time_inputs(lambda q: prepare_scene(q, object_detector, all_classes, all_child_classes, all_attributes, None, image_loader, args.lazy_perception), questions, args.repeats),
+        "build_scene_program": time_inputs(lambda scene: build_scene_program(scene, all_classes, all_attributes), scenes, args.repeats)
+    }
+    rows = [{"benchmark": name, "num_objects": num_objects, "operator_mix": operator_mix, **summarize_times(times)} for name, times in timings.items()]
+
+    # clingo is timed per question instead of per pass, grounding and solving separately
+    solutions = [
+        session.solve(program, encode_question(q, as_program=True))
+        for _ in range(args.solve_repeats) for q, program in zip(questions, programs)
+    ]
+    statistics = {
+        "timeouts": sum(s["timeout"] for s in solutions),
+        **{key: float(np.mean([s["statistics"][key] for s in solutions])) for key in ["num_atoms", "num_rules", "num_weak_constraints", "num_choices", "num_conflicts"]}
+    }
+    for name in ["ground", "solve"]:
+        rows.append({
+            "benchmark": f"clingo_{name}", "num_objects": num_objects, "operator_mix": operator_mix,
+            **summarize_times([s[f"{name}_sec"] for s in solutions]), **statistics
+        })
+
+    return rows
+
+
+def compare_results(results, baseline, tolerance):
+    # ratio of the fastest repeat of every benchmark to that of the baseline, above 1 + tolerance it is a regression
+    baseline_rows = {(r["benchmark"], r["num_objects"], r["operator_mix"]): r for r in baseline["results"]}
+    comparison = []
+    for row in results:
+        key = (row["benchmark"], row["num_objects"], row["operator_mix"])
+        if key in baseline_rows and baseline_rows[key]["min_sec"] > 0:
+            ratio = row["min_sec"] / baseline_rows[key]["min_sec"]
+            comparison.append({
+                "benchmark": row["benchmark"], "num_objects": row["num_objects"], "operator_mix": row["operator_mix"],
+                "baseline_min_sec": baseline_rows[key]["min_sec"], "min_sec": row["min_sec"], "ratio": ratio, "regression": ratio > 1 + tolerance
+            })
+    return comparison
+
+
+def run(args):
+    check_pattern_corpora()
+    torch.set_num_threads(args.num_threads)
+    with open(args.theory) as theory_file:
+        session = SolverSession(theory_file.read(), args.timeout)
+
+    vocabulary = make_vocabulary(args.num_categories, args.num_classes, args.num_attributes, args.num_values, args.num_relations)
+
+    results = []
+    for num_objects, operator_mix in itertools.product(args.num_objects, args.operator_mixes):
+        start = time.time()
+        results.extend(run_cell(num_objects, operator_mix, vocabulary, session, args))
+        print(f"{num_objects:4d} objects, {operator_mix:>10s}: {time.time() - start:.1f}s")
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ["output", "compare"]},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "numpy": np.__version__,
+            "torch": torch.__version__,
+            "clingo": clingo.__version__
+        },
+        "results": results
+    }
+
+    regressions = []
+    if args.compare is not None:
+        with open(args.compare) as f:
+            report["comparison"] = compare_results(results, json.load(f), args.tolerance)
+        regressions = [r for r in report["comparison"] if r["regression"]]
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+
+    for row in results:
+        print(f"{row['benchmark']:>34s} {row['num_objects']:4d} {row['operator_mix']:>10s}: p50 {row['p50_sec']*1000:9.3f}ms, min {row['min_sec']*1000:9.3f}ms")
+    if args.compare is not None:
+        for r in regressions:
+            print(f"Regression: {r['benchmark']} ({r['num_objects']} objects, {r['operator_mix']}) {r['ratio']:.2f}x slower than {args.compare}")
+        print(f"{len(regressions)} of {len(report['comparison'])} benchmarks regressed by more than {args.tolerance*100:.0f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the encoding and solving hot paths on synthetic scene graphs and question programs, without data, network or GPU. The nltk corpora of pattern have to be installed once beforehand: python -m nltk.downloader wordnet wordnet_ic sentiwordnet")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="results of an earlier run, the benchmarks that got slower are reported")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown of a benchmark that counts as regression")
+    parser.add_argument("--theory", default="pipeline/encoding/theory.lp")
+    parser.add_argument("--num-objects", type=int, nargs="+", default=[2, 5, 10, 20, 40], help="objects per scene graph")
+    parser.add_argument("--operator-mixes", nargs="+", default=list(OPERATOR_MIXES.keys()), choices=list(OPERATOR_MIXES.keys()))
+    parser.add_argument("--questions-per-cell", type=int, default=8, help="synthetic questions per number of objects and operator mix")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--solve-repeats", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=10.0, help="solving timeout per question in seconds")
+    parser.add_argument("--lazy-perception", action="store_true", help="prepare the scenes as the lazy perception of the runner does")
+    parser.add_argument("--num-categories", type=int, default=8)
+    parser.add_argument("--num-classes", type=int, default=80)
+    parser.add_argument("--num-attributes", type=int, default=8)
+    parser.add_argument("--num-values", type=int, default=6, help="values per attribute")
+    parser.add_argument("--num-relations", type=int, default=12)
+    parser.add_argument("--num-threads", type=int, default=1, help="torch threads, fixed so that runs stay comparable")
+    parser.add_argument("--seed", type=int, default=0)
+    regressions = run(parser.parse_args())
+    if len(regressions) > 0:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
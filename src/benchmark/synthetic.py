@@ -0,0 +1,193 @@
+import numpy as np
+import torch
+from object_detection.object_detector import BaseObjectDetector
+from object_detection.detections import Detections
+
+# templates of GQA-style semantic programs, grouped into the operator mixes of the benchmark grid
+OPERATOR_MIXES = {
+    "attribute": ["query", "filter_query", "verify", "choose"],
+    "relation": ["relate_query", "relate_any", "verify_rel", "choose_rel"],
+    "logical": ["exist", "and", "or"],
+    "comparison": ["same", "different", "common", "relate_same"]
+}
+OPERATOR_MIXES["mixed"] = [template for templates in OPERATOR_MIXES.values() for template in templates]
+
+
+def make_vocabulary(num_categories=8, num_classes=80, num_attributes=8, num_values=6, num_relations=12):
+    # all_classes and all_attributes in the format of the GQA metadata (underscores instead of spaces), plus relations
+    all_classes = {f"category_{c}": [] for c in range(num_categories)}
+    for i in range(num_classes):
+        all_classes[f"category_{i % num_categories}"].append(f"class_{i}")
+
+    # attribute names are single words like in GQA (color, size, ...), they appear unchanged in the question programs
+    all_attributes = {f"attribute{a}": [f"value_{a}_{v}" for v in range(num_values)] for a in range(num_attributes)}
+    return {
+        "all_classes": all_classes,
+        "all_attributes": all_attributes,
+        "relations": [f"relation {r}" for r in range(num_relations)]
+    }
+
+
+def make_scene_graph(num_objects, vocabulary, rng, width=640, height=480, relations_per_object=3):
+    # objects with random boxes, one value for about half of the attributes and relations to random other objects, in
+    # the format of the GQA scene graphs
+    classes = [c.replace("_", " ") for c in sum(vocabulary["all_classes"].values(), [])]
+    attributes = vocabulary["all_attributes"]
+
+    objects = {}
+    for o in range(num_objects):
+        w, h = rng.integers(16, width//2), rng.integers(16, height//2)
+        objects[str(o)] = {
+            "name": classes[rng.integers(len(classes))],
+            "x": int(rng.integers(0, width - w)), "y": int(rng.integers(0, height - h)), "w": int(w), "h": int(h),
+            "attributes": [values[rng.integers(len(values))] for values in attributes.values() if rng.random() < 0.5],
+            "relations": []
+        }
+
+    if num_objects > 1:
+        for oid, obj in objects.items():
+            for _ in range(relations_per_object):
+                target = str((int(oid) + rng.integers(1, num_objects)) % num_objects)
+                obj["relations"].append({"name": vocabulary["relations"][rng.integers(len(vocabulary["relations"]))], "object": target})
+
+    return {"width": width, "height": height, "objects": objects}
+
+
+def __pick_object__(scene_graph, rng):
+    oid = list(scene_graph["objects"].keys())[rng.integers(len(scene_graph["objects"]))]
+    return oid, scene_graph["objects"][oid]
+
+
+def __pick_value__(obj, vocabulary, rng):
+    # an attribute and a value of it, the object's own value if it has one for the attribute
+    attribute = list(vocabulary["all_attributes"].keys())[rng.integers(len(vocabulary["all_attributes"]))]
+    values = vocabulary["all_attributes"][attribute]
+    own_values = [v for v in obj["attributes"] if v in values]
+    return attribute, own_values[0] if len(own_values) > 0 else values[rng.integers(len(values))]
+
+
+def __pick_relation__(obj, scene_graph, vocabulary, rng):
+    # a relation of the object and the class of its target, a random one if it has none
+    if len(obj["relations"]) > 0:
+        relation = obj["relations"][rng.integers(len(obj["relations"]))]
+        return relation["name"], relation["object"], scene_graph["objects"][relation["object"]]["name"]
+    oid, target = __pick_object__(scene_graph, rng)
+    return vocabulary["relations"][rng.integers(len(vocabulary["relations"]))], oid, target["name"]
+
+
+def __select__(scene_graph, rng):
+    oid, obj = __pick_object__(scene_graph, rng)
+    return oid, obj, {"operation": "select", "argument": f"{obj['name']} ({oid})", "dependencies": []}
+
+
+def make_semantic_program(template, scene_graph, vocabulary, rng):
+    # a semantic program of the template whose arguments refer to the objects, values and relations of the scene graph
+    oid, obj, select = __select__(scene_graph, rng)
+    attribute, value = __pick_value__(obj, vocabulary, rng)
+    other_value = vocabulary["all_attributes"][attribute][0]
+    relation, target_id, target_class = __pick_relation__(obj, scene_graph, vocabulary, rng)
+
+    if template == "query":
+        return [select, {"operation": "query", "argument": attribute, "dependencies": [0]}]
+    if template == "filter_query":
+        return [select, {"operation": f"filter {attribute}", "argument": value, "dependencies": [0]}, {"operation": "query", "argument": "name", "dependencies": [1]}]
+    if template == "verify":
+        return [select, {"operation": f"verify {attribute}", "argument": value, "dependencies": [0]}]
+    if template == "choose":
+        return [select, {"operation": f"choose {attribute}", "argument": f"{value}|{other_value}", "dependencies": [0]}]
+    if template == "relate_query":
+        return [select, {"operation": "relate", "argument": f"{target_class},{relation},s ({target_id})", "dependencies": [0]}, {"operation": "query", "argument": attribute, "dependencies": [1]}]
+    if template == "relate_any":
+        return [select, {"operation": "relate", "argument": f"_,{relation},s ({target_id})", "dependencies": [0]}, {"operation": "query", "argument": "name", "dependencies": [1]}]
+    if template == "verify_rel":
+        return [select, {"operation": "verify rel", "argument": f"{target_class},{relation},o ({target_id})", "dependencies": [0]}]
+    if template == "choose_rel":
+        other_relation = vocabulary["relations"][0] if relation != vocabulary["relations"][0] else vocabulary["relations"][1]
+        return [select, {"operation": "choose rel", "argument": f"{target_class},{relation}|{other_relation},s ({target_id})", "dependencies": [0]}]
+    if template == "exist":
+        return [select, {"operation": f"filter {attribute}", "argument": value, "dependencies": [0]}, {"operation": "exist", "argument": "?", "dependencies": [1]}]
+    if template in ["and", "or"]:
+        _, _, other_select = __select__(scene_graph, rng)
+        return [
+            select, {"operation": "exist", "argument": "?", "dependencies": [0]},
+            other_select, {"operation": "exist", "argument": "?", "dependencies": [2]},
+            {"operation": template, "argument": "", "dependencies": [1, 3]}
+        ]
+    if template in ["same", "different"]:
+        _, _, other_select = __select__(scene_graph, rng)
+        return [select, other_select, {"operation": f"{template} {attribute}", "argument": "", "dependencies": [0, 1]}]
+    if template == "common":
+        _, _, other_select = __select__(scene_graph, rng)
+        return [select, other_select, {"operation": "common", "argument": "", "dependencies": [0, 1]}]
+    if template == "relate_same":
+        return [select, {"operation": "relate", "argument": f"{target_class},same {attribute},o ({target_id})", "dependencies": [0]}, {"operation": "exist", "argument": "?", "dependencies": [1]}]
+
+    raise RuntimeError(f"Unknown semantic program template {template}!")
+
+
+def make_questions(num_questions, num_objects, operator_mix, vocabulary, rng):
+    # questions in the format of the GQA question files, each with its own scene graph
+    questions = []
+    for q in range(num_questions):
+        scene_graph = make_scene_graph(num_objects, vocabulary, rng)
+        template = OPERATOR_MIXES[operator_mix][q % len(OPERATOR_MIXES[operator_mix])]
+        questions.append({
+            "qid": f"{operator_mix}_{num_objects}_{q}",
+            "imageId": f"{operator_mix}_{num_objects}_{q}",
+            "semantic": make_semantic_program(template, scene_graph, vocabulary, rng),
+            "sceneGraph": scene_graph
+        })
+    return questions
+
+
+def make_detections(scene_graph, vocabulary, rng, duplicate_rate=0.5, jitter=0.05):
+    # the objects of the scene graph as detections, plus jittered duplicates of about duplicate_rate of them, like the
+    # overlapping detections of a detector
+    objects = []
+    for obj in scene_graph["objects"].values():
+        objects.append({"x": obj["x"], "y": obj["y"], "w": obj["w"], "h": obj["h"], "score": float(rng.uniform(0.1, 1.0)), "name": obj["name"]})
+        if rng.random() < duplicate_rate:
+            dx, dy = rng.normal(0, jitter*obj["w"]), rng.normal(0, jitter*obj["h"])
+            objects.append({**objects[-1], "x": obj["x"] + dx, "y": obj["y"] + dy, "score": float(rng.uniform(0.1, 1.0))})
+
+    order = rng.permutation(len(objects))
+    return Detections.from_objects([objects[i] for i in order], vocabulary)
+
+
+class SyntheticImageLoader:
+    # blank images of the size of the questions' scene graphs, in place of an ImageLoader
+    def __init__(self, questions):
+        self.images = {q["imageId"]: torch.zeros((3, q["sceneGraph"]["height"], q["sceneGraph"]["width"]), dtype=torch.uint8) for q in questions}
+
+    def get(self, image_id):
+        return self.images[image_id]
+
+
+class SyntheticObjectDetector(BaseObjectDetector):
+    # detects the objects of the questions' scene graphs (and their jittered duplicates) whose class is searched for
+    def __init__(self, questions, seed=0):
+        super().__init__("cpu")
+        rng = np.random.default_rng(seed)
+        self.detections = {q["imageId"]: make_detections(q["sceneGraph"], self.vocabulary, rng) for q in questions}
+
+    def detect_objects(self, image, classes, threshold, k, image_id=None):
+        detections = self.detections[image_id]
+        searched = torch.tensor([name in classes for name in detections.names], dtype=torch.bool)
+        return detections[searched & (detections.scores >= threshold)].top_k(k)
+
+
+def add_synthetic_probs(scene, rng):
+    # random attribute, standalone value and relation probabilities in place of the VLM scores
+    if "attr_objects" in scene:
+        num_objects = len(scene["attr_objects"])
+        if len(scene["attributes"]) > 0:
+            probs = rng.uniform(0.01, 0.99, (num_objects, scene["num_attr_values"]))
+            scene["attr_probs"] = [probs.tolist(), (1 - probs).tolist()]
+        if len(scene["standalone_values"]) > 0:
+            probs = rng.uniform(0.01, 0.99, (num_objects, len(scene["standalone_values"])))
+            scene["standalone_probs"] = [probs.tolist(), (1 - probs).tolist()]
+
+    if "rel_pairs" in scene:
+        probs = rng.uniform(0.01, 0.99, (len(scene["rel_pairs"]), len(scene["relations"])))
+        scene["rel_probs"] = [probs.tolist(), (1 - probs).tolist()]
+    return scene
@@ -0,0 +1,138 @@
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+import torch
+from torchvision.ops import box_iou
+from evaluation.question_loading import stream_questions
+from evaluation.runner import batched, get_device, load_models
+from evaluation.question_evaluation import is_scene_question, answer_is_correct
+from pipeline.encoding.scene_encoding import prepare_scene, score_scenes, build_scene_program
+from pipeline.encoding import encode_question
+from pipeline.solving import SolverSession
+
+
+def get_detection_agreement(reference_objects, objects, iou_threshold=0.5):
+    # fraction of the reference detections that have a detection of the same class with an overlapping box
+    if len(reference_objects) == 0:
+        return 1.0
+    if len(objects) == 0:
+        return 0.0
+
+    same_name = torch.tensor([[a == b for b in objects.names] for a in reference_objects.names])
+    overlaps = box_iou(reference_objects.get_corner_boxes(), objects.get_corner_boxes()) > iou_threshold
+    return (overlaps & same_name).any(dim=1).float().mean().item()
+
+
+def get_prob_diffs(reference_scene, scene):
+    # absolute differences of all attribute, standalone value and relation probabilities of the same scene
+    diffs = [
+        np.abs(np.asarray(reference_scene[key]) - np.asarray(scene[key])).reshape(-1)
+        for key in ["attr_probs", "standalone_probs", "rel_probs"] if key in reference_scene
+    ]
+    return np.concatenate(diffs) if len(diffs) > 0 else np.zeros(0)
+
+
+def run(args):
+    with open(args.theory) as theory_file:
+        theory = theory_file.read()
+
+    with open(f"{args.metadata_dir}/gqa_all_attribute.json") as f:
+        all_attributes = json.load(f)
+
+    with open(f"{args.metadata_dir}/gqa_all_class.json") as f:
+        all_classes = json.load(f)
+        all_child_classes = [c.replace("_", " ") for c in itertools.chain(*all_classes.values())]
+
+    # the candidate (backend, precision, ...) against the plain fp32 torch models, both on the device of the candidate
+    gpu = get_device(args.backend)
+    reference_args = argparse.Namespace(**{**vars(args), "backend": "torch", "precision": "fp32", "compile": False, "channels_last": False})
+    # no detection cache at all, so that both detectors really run on every image
+    reference_model, reference_detector, _ = load_models(reference_args, gpu, cache_detections=False)
+    model, object_detector, _ = load_models(args, gpu, cache_detections=False)
+
+    session = SolverSession(theory, args.timeout)
+    questions = [q for q in stream_questions(args.questions, args.num_questions) if not is_scene_question(q)]
+
+    rows = []
+    perception_sec = {"reference": 0.0, "candidate": 0.0}
+    for batch in batched(questions, args.batch_size):
+        start = time.time()
+        reference_scenes = [prepare_scene(q, reference_detector, all_classes, all_child_classes, all_attributes, args.images) for q in batch]
+        score_scenes(reference_scenes, reference_model)
+        perception_sec["reference"] += time.time() - start
+
+        start = time.time()
+        scenes = [prepare_scene(q, object_detector, all_classes, all_child_classes, all_attributes, args.images) for q in batch]
+        score_scenes(scenes, model)
+        perception_sec["candidate"] += time.time() - start
+
+        # the candidate VLM on exactly the reference crops and prompts, to separate its drift from the detector's
+        shared_scenes = [dict(scene) for scene in reference_scenes]
+        score_scenes(shared_scenes, model)
+
+        for question, reference_scene, scene, shared_scene in zip(batch, reference_scenes, scenes, shared_scenes):
+            question_encoding = encode_question(question, as_program=True)
+            reference_answers = session.solve(build_scene_program(reference_scene, all_classes, all_attributes), question_encoding)["answers"]
+            answers = session.solve(build_scene_program(scene, all_classes, all_attributes), question_encoding)["answers"]
+            prob_diffs = get_prob_diffs(reference_scene, shared_scene)
+
+            rows.append({
+                "question_id": question["qid"],
+                "reference_correct": answer_is_correct(reference_answers, question["answer"]),
+                "candidate_correct": answer_is_correct(answers, question["answer"]),
+                "same_answer": sorted(reference_answers) == sorted(answers),
+                "detection_agreement": get_detection_agreement(reference_scene["objects"], scene["objects"]),
+                "max_prob_diff": float(prob_diffs.max()) if len(prob_diffs) > 0 else 0.0,
+                "mean_prob_diff": float(prob_diffs.mean()) if len(prob_diffs) > 0 else 0.0
+            })
+
+    report = {
+        "candidate": {"backend": args.backend, "precision": args.precision, "compile": args.compile, "channels_last": args.channels_last},
+        "num_questions": len(rows),
+        "reference_accuracy": sum(r["reference_correct"] for r in rows) / max(len(rows), 1) * 100,
+        "candidate_accuracy": sum(r["candidate_correct"] for r in rows) / max(len(rows), 1) * 100,
+        "answer_agreement": sum(r["same_answer"] for r in rows) / max(len(rows), 1) * 100,
+        "detection_agreement": float(np.mean([r["detection_agreement"] for r in rows])) if len(rows) > 0 else 0.0,
+        "max_prob_diff": max((r["max_prob_diff"] for r in rows), default=0.0),
+        "mean_prob_diff": float(np.mean([r["mean_prob_diff"] for r in rows])) if len(rows) > 0 else 0.0,
+        "reference_perception_sec": perception_sec["reference"],
+        "candidate_perception_sec": perception_sec["candidate"],
+        "speedup": perception_sec["reference"] / perception_sec["candidate"] if perception_sec["candidate"] > 0 else 0.0,
+        "questions": rows
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Accuracy: fp32 {report['reference_accuracy']:.2f}%, {args.backend}/{args.precision} {report['candidate_accuracy']:.2f}%, same answer {report['answer_agreement']:.2f}%, speedup {report['speedup']:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the accuracy drift of a backend/inference mode against fp32 on a slice of GQA")
+    parser.add_argument("--questions", default="../data/questions/testdev_balanced_questions.json")
+    parser.add_argument("--images", default="../data/images")
+    parser.add_argument("--metadata-dir", default="../data/metadata")
+    parser.add_argument("--theory", default="pipeline/encoding/theory.lp")
+    parser.add_argument("--output", default="drift_report.json")
+    parser.add_argument("--num-questions", type=int, default=500, help="size of the reference slice (from the start of the question file)")
+    parser.add_argument("--model", default="clip", choices=["clip", "blip", "xvlm-vipergpt", "xvlm-itr-coco"])
+    parser.add_argument("--clip-model", default="openai/clip-vit-base-patch32")
+    parser.add_argument("--snapshot", default=None)
+    parser.add_argument("--owl-model", default="google/owlvit-large-patch14")
+    parser.add_argument("--backend", default="int8", choices=["torch", "int8", "onnx"])
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "bf16", "fp16"])
+    parser.add_argument("--compile", action="store_true")
+    parser.add_argument("--channels-last", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    # no text bank, its features are those of one backend
+    args.detection_cache_dir, args.text_bank = None, False
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import numpy as np
+from pipeline.utils import sanitize_asp
+
+
+def answer_is_correct(answers, correct_answer):
+    correct = False 
+
+    for answer in answers:
+        if answer == sanitize_asp(correct_answer): 
+            correct = True
+        elif (answer == "to_the_right_of" and correct_answer == "right") or \
+            (answer == "to_the_left_of" and correct_answer == "left") or \
+            (answer == "in_front_of" and correct_answer == "front"):
+            correct = True
+    return correct 
+
+
+def count_operators(question):
+    operations = ["select", "query", "filter", "relate", "verify", "choose", "exist", "or", "different", "and", "same", "common"]
+    op_counts = {f"op_{op}": 0 for op in operations}
+    for op in question["semantic"]:
+        operator = op["operation"].split(" ")[0]
+        op_counts[f"op_{operator}"] += 1
+    return op_counts
+
+
+def is_scene_question(question):
+    return question["semantic"][0]["operation"] == "select" and question["semantic"][0]["argument"] == "scene"
+
+
+def get_question_result(question):
+    return {
+        "question_id": question["qid"], 
+        "semantic_str": question["semanticStr"], 
+        "image_id": question["imageId"],
+        "question_type": question.get("types", {}).get("structural"),
+        "answer": question["answer"],
+        **count_operators(question)
+    }
+
+
+def get_skipped_result(question):
+    return {**get_question_result(question), "skipped": True, "model_response": None, "correct": False, "timeout": False, "runtime_sec": 0.0}
+
+
+def get_answer_result(question, answers, timeout):
+    result = {**get_question_result(question), "skipped": False, "timeout": timeout}
+    if len(answers) > 0:
+        return {**result, "model_response": answers, "correct": answer_is_correct(answers, question["answer"])}
+    else: 
+        return {**result, "model_response": "UNSAT", "correct": False}
+
+
+def summarize_results(results):
+    num_skipped = sum(1 for r in results if r["skipped"])
+    num_correct = sum(1 for r in results if r["correct"])
+    num_incorrect = sum(1 for r in results if not r["skipped"] and not r["correct"])
+    num_unsat = sum(1 for r in results if r["model_response"] == "UNSAT")
+    num_timeout = sum(1 for r in results if r["timeout"])
+
+    return {
+        "step": len(results),
+        "correct": num_correct, 
+        "incorrect": num_incorrect, 
+        "unsat": num_unsat, 
+        "timeout": num_timeout,
+        "skipped": num_skipped, 
+        "correct_percentage": num_correct/(num_incorrect+num_correct)*100 if num_incorrect+num_correct > 0 else 0.0
+    }
+
+
+
+def summarize_stage_timings(results):
+    # distribution of every stage time, count and solver statistic over the answered questions, and their means per
+    # question type, a stage that did not run for a question counts as 0, a statistic without value (None) is left out
+    results = [r for r in results if not r["skipped"]]
+    keys = list(dict.fromkeys(k for r in results for k in r if k.endswith("_sec") or k.startswith("num_")))
+
+    def get_values(rows, key):
+        return np.array([r.get(key, 0.0) for r in rows if r.get(key, 0.0) is not None], dtype=np.float64)
+
+    def summarize(values):
+        if len(values) == 0:
+            return None
+        return {
+            "mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "max": float(values.max()),
+            "total": float(values.sum())
+        }
+
+    by_question_type = {}
+    for r in results:
+        by_question_type.setdefault(str(r.get("question_type")), []).append(r)
+
+    return {
+        "num_questions": len(results),
+        "overall": {k: summarize(get_values(results, k)) for k in keys},
+        "by_question_type": {
+            question_type: {
+                "num_questions": len(rows),
+                **{k: float(get_values(rows, k).mean()) if len(get_values(rows, k)) > 0 else None for k in keys}
+            }
+            for question_type, rows in sorted(by_question_type.items())
+        }
+    }
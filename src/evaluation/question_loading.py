@@ -0,0 +1,11 @@
+import itertools
+import json
+
+
+def stream_questions(questions_file, num_questions=None):
+    with open(questions_file) as f:
+        questions = json.load(f)
+
+    for qid, question in itertools.islice(questions.items(), num_questions):
+        question["qid"] = qid
+        yield question
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# path hack to allow importing pattern (as in the notebooks)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../externals")))
+
+from evaluation.question_loading import stream_questions
+from evaluation.question_evaluation import get_skipped_result, get_answer_result, summarize_results, summarize_stage_timings
+from pipeline.solving import SolverPool
+
+
+def run(args):
+    with open(args.theory) as theory_file:
+        theory = theory_file.read()
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    # the answers of the questions come from the question file, their encodings (scene and question) from the .lp files
+    questions = list(stream_questions(args.questions, args.num_questions))
+    encoded = {f[:-3] for f in os.listdir(args.encoded_dir) if f.endswith(".lp")}
+    results = [get_skipped_result(q) for q in questions if q["qid"] not in encoded]
+    print(f"Replaying {len(questions) - len(results)} encodings, {len(results)} questions have none and are skipped")
+
+    with SolverPool(theory, num_workers=args.num_workers, timeout=args.timeout) as pool:
+        pending = {}
+
+        def collect():
+            done, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                question = pending.pop(future)
+                solution = future.result()
+                results.append({
+                    **get_answer_result(question, solution["answers"], solution["timeout"]),
+                    "ground_sec": solution["ground_sec"],
+                    "solve_sec": solution["solve_sec"],
+                    "runtime_sec": solution["ground_sec"] + solution["solve_sec"],
+                    **solution["statistics"]
+                })
+
+                if len(results) % args.report_steps == 0:
+                    summary = summarize_results(results)
+                    print(f"Step {summary['step']:7d}: Corr {summary['correct']:7d}, Incorr {summary['incorrect']:7d}, UNSAT {summary['unsat']:7d}, Skip {summary['skipped']:5d}, Corr %: {summary['correct_percentage']:.4f}%")
+
+        # the files hold the scene and the question encoding, they are only read shortly before they are solved
+        for question in questions:
+            if question["qid"] in encoded:
+                with open(f"{args.encoded_dir}/{question['qid']}.lp") as f:
+                    pending[pool.submit(f.read(), "")] = question
+                while len(pending) > args.max_pending:
+                    collect()
+
+        while len(pending) > 0:
+            collect()
+
+    question_order = {q["qid"]: i for i, q in enumerate(questions)}
+    results.sort(key=lambda r: question_order[r["question_id"]])
+    with open(f"{args.output_dir}/results.jsonl", "w") as f:
+        f.writelines(json.dumps(result) + "\n" for result in results)
+
+    summary = summarize_results(results)
+    with open(f"{args.output_dir}/summary.json", "w") as f:
+        json.dump(summary, f, indent=4)
+    with open(f"{args.output_dir}/timings.json", "w") as f:
+        json.dump(summarize_stage_timings(results), f, indent=4)
+    print(f"Done: Corr {summary['correct']:7d}, Incorr {summary['incorrect']:7d}, UNSAT {summary['unsat']:7d}, Timeout {summary['timeout']:5d}, Skip {summary['skipped']:5d}, Corr %: {summary['correct_percentage']:.4f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve stored ASP encodings against a theory, without any perception")
+    parser.add_argument("--questions", default="../data/questions/testdev_balanced_questions.json")
+    parser.add_argument("--encoded-dir", default="../data/encoded_questions", help="directory with the {qid}.lp encodings of a run")
+    parser.add_argument("--theory", default="pipeline/encoding/theory.lp")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--num-questions", type=int, default=None)
+    parser.add_argument("--num-workers", type=int, default=max(1, os.cpu_count() - 1), help="number of ASP solver processes")
+    parser.add_argument("--max-pending", type=int, default=256, help="maximum number of encodings waiting for the solver")
+    parser.add_argument("--timeout", type=float, default=10.0, help="solving timeout per question in seconds")
+    parser.add_argument("--report-steps", type=int, default=200)
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
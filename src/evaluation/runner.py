@@ -0,0 +1,298 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# path hack to allow importing pattern (as in the notebooks)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../externals")))
+
+import torch
+from evaluation.question_loading import stream_questions
+from evaluation.question_evaluation import is_scene_question, get_skipped_result, get_answer_result, summarize_results, summarize_stage_timings
+from pipeline.encoding import encode_scenes, reencode_scenes, encode_question
+from pipeline.encoding.perception_store import PerceptionStore, get_perception_key
+from pipeline.solving import SolverPool
+from pipeline.image_loading import ImageLoader
+from pipeline.instrumentation import StageTimer, recording, stage
+
+
+def group_by_image(questions, window=1024):
+    # the questions of an image are moved next to its first question, so that its perception work is shared; only the
+    # next window questions of the stream are held back, an image whose questions are further apart is split up
+    groups = OrderedDict()
+    num_buffered = 0
+    for question in questions:
+        groups.setdefault(question["imageId"], []).append(question)
+        num_buffered += 1
+        while num_buffered > window:
+            _, group = groups.popitem(last=False)
+            num_buffered -= len(group)
+            yield from group
+
+    for group in groups.values():
+        yield from group
+
+
+def batched(iterable, batch_size):
+    # batches of at least batch_size questions, which are only cut between questions about different images
+    batch = []
+    for question in iterable:
+        if len(batch) >= batch_size and question["imageId"] != batch[-1]["imageId"]:
+            yield batch
+            batch = []
+        batch.append(question)
+
+    if len(batch) > 0:
+        yield batch
+
+
+def load_results(results_file):
+    if not os.path.isfile(results_file):
+        return []
+
+    with open(results_file) as f:
+        lines = f.readlines()
+
+    # a run that was killed mid-write leaves a truncated last line, which is dropped so that appending can continue
+    if len(lines) > 0 and not lines[-1].endswith("\n"):
+        lines = lines[:-1]
+        with open(results_file, "w") as f:
+            f.writelines(lines)
+
+    return [json.loads(line) for line in lines]
+
+
+def load_model(args, gpu, backend="torch"):
+    if backend != "torch" and args.model != "clip":
+        raise RuntimeError(f"The {backend} backend is only supported for CLIP!")
+
+    if args.model == "clip":
+        from model.clip_model import CLIPModel
+        model = CLIPModel(gpu, model=args.clip_model, snapshot=args.snapshot, backend=backend)
+    elif args.model == "blip":
+        from model.blip_model import BLIPModel
+        model = BLIPModel(gpu)
+    elif args.model == "xvlm-vipergpt":
+        from model.vipergpt_xvlm_model import XVLMModel
+        model = XVLMModel(gpu)
+    elif args.model == "xvlm-itr-coco":
+        from model.xvlm_itr_coco_model import XVLMModel
+        model = XVLMModel(gpu)
+    else:
+        raise RuntimeError(f"Unsupported model {args.model}!")
+    return model
+
+
+def load_models(args, gpu, cache_detections=True):
+    from model.inference_mode import InferenceMode
+    inference_mode = InferenceMode(args.precision, args.compile, args.channels_last)
+
+    model = load_model(args, gpu, args.backend)
+    model.set_inference_mode(inference_mode)
+
+    from object_detection.owl_vit_object_detector import OWLViTObjectDetector
+    from object_detection.detection_cache import DetectionCache
+    cache = DetectionCache(cache_dir=args.detection_cache_dir) if cache_detections else None
+    object_detector = OWLViTObjectDetector(gpu, model=args.owl_model, cache=cache, backend=args.backend)
+    object_detector.set_inference_mode(inference_mode)
+
+    text_bank = None
+    if args.text_bank:
+        from pipeline.encoding.text_embedding_bank import TextEmbeddingBank
+        text_bank = TextEmbeddingBank(model)
+
+    return model, object_detector, text_bank
+
+
+def write_encoding(encoded_dir, qid, scene_encoding, question_encoding):
+    with open(f"{encoded_dir}/{qid}.lp", "w") as f:
+        f.write("% ------ scene encoding ------\n")
+        f.write(str(scene_encoding))
+        f.write("\n% ------ question encoding ------\n")
+        f.write(str(question_encoding))
+
+
+def get_device(backend="torch"):
+    # the int8 and onnx backends are CPU backends
+    if backend != "torch":
+        return torch.device("cpu")
+    elif torch.cuda.is_available():
+        return torch.device("cuda")
+    elif torch.backends.mps.is_available():
+        return torch.device("mps")
+    else:
+        print("Warning: no GPU detected, falling back to CPU")
+        return torch.device("cpu")
+
+
+def run(args):
+    gpu = get_device(args.backend)
+
+    with open(args.theory) as theory_file:
+        theory = theory_file.read()
+
+    with open(f"{args.metadata_dir}/gqa_all_attribute.json") as f:
+        all_attributes = json.load(f)
+
+    with open(f"{args.metadata_dir}/gqa_all_class.json") as f:
+        all_classes = json.load(f)
+        all_child_classes = [c.replace("_", " ") for c in itertools.chain(*all_classes.values())]
+
+    for directory in [args.output_dir, args.encoded_dir]:
+        if directory is not None and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    results_file = f"{args.output_dir}/results.jsonl"
+    results = load_results(results_file)
+    completed = {r["question_id"] for r in results}
+    print(f"Resuming after {len(completed)} completed questions")
+
+    # the position of every question in the question file, to report the results in its order
+    question_order = {}
+    def stream_remaining_questions():
+        for question in stream_questions(args.questions, args.num_questions):
+            question_order[question["qid"]] = len(question_order)
+            if question["qid"] not in completed:
+                yield question
+    questions = stream_remaining_questions()
+
+    if args.reencode:
+        # encodings are rebuilt from the perception store, the models are not needed
+        if args.perception_store is None:
+            raise RuntimeError("Re-encoding needs a perception store!")
+        model, object_detector, text_bank = None, None, None
+        perception_store = PerceptionStore(args.perception_store, args.store_version)
+    else:
+        model, object_detector, text_bank = load_models(args, gpu)
+        perception_store = PerceptionStore(args.perception_store, get_perception_key(model, object_detector, args.lazy_perception)) if args.perception_store is not None else None
+
+    # direct encodings are sent to the solvers as AspPrograms and added through the clingo backend, text is only for debugging
+    as_program = args.encoding == "direct"
+
+    # perception runs in this process on the device, ASP solving in a pool of CPU worker processes
+    pending = {}
+
+    # images are decoded ahead of the question stream, on the GPU if requested
+    image_loader = ImageLoader(args.images, max_images=args.image_cache_size, num_threads=args.loader_threads, device=gpu if args.gpu_decode else None)
+
+    with SolverPool(theory, num_workers=args.num_workers, timeout=args.timeout) as pool, image_loader, open(results_file, "a") as out:
+        def write_result(result):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            results.append(result)
+
+            if len(results) % args.report_steps == 0:
+                summary = summarize_results(results)
+                print(f"Step {summary['step']:7d}: Corr {summary['correct']:7d}, Incorr {summary['incorrect']:7d}, UNSAT {summary['unsat']:7d}, Skip {summary['skipped']:5d}, Corr %: {summary['correct_percentage']:.4f}%")
+
+        def collect(timeout=None):
+            done, _ = wait(pending.keys(), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                question, perception_sec, timer = pending.pop(future)
+                solution = future.result()
+                write_result({
+                    **get_answer_result(question, solution["answers"], solution["timeout"]), 
+                    "perception_sec": perception_sec, 
+                    "ground_sec": solution["ground_sec"], 
+                    "solve_sec": solution["solve_sec"], 
+                    "runtime_sec": perception_sec + solution["ground_sec"] + solution["solve_sec"],
+                    **solution["statistics"],
+                    **timer.to_row()
+                })
+
+        if args.group_by_image:
+            questions = group_by_image(questions, args.group_window)
+        if not args.reencode:
+            questions = image_loader.prefetch_stream(questions, args.prefetch)
+        for batch in batched(questions, args.batch_size):
+            for question in batch:
+                if is_scene_question(question):
+                    write_result(get_skipped_result(question))
+            batch = [q for q in batch if not is_scene_question(q)]
+            if len(batch) == 0:
+                continue
+
+            # per stage times and counts of every question, they are added to its result row
+            timers = [StageTimer() for _ in batch]
+            start = time.time()
+            if args.reencode:
+                scene_encodings = reencode_scenes(batch, perception_store, all_classes, all_attributes, as_program)
+            else:
+                scene_encodings = encode_scenes(batch, model, object_detector, all_classes, all_child_classes, all_attributes, args.images, text_bank, as_program, image_loader, args.lazy_perception, perception_store, timers)
+            perception_sec = (time.time() - start) / len(batch)
+
+            for question, scene_encoding, timer in zip(batch, scene_encodings, timers):
+                with recording(timer), stage("question_encoding"):
+                    question_encoding = encode_question(question, as_program)
+                if args.encoded_dir is not None:
+                    write_encoding(args.encoded_dir, question["qid"], scene_encoding, question_encoding)
+
+                future = pool.submit(scene_encoding, question_encoding)
+                pending[future] = (question, perception_sec, timer)
+
+            # keep the solver pool busy, but do not let perception run arbitrarily far ahead of it
+            collect(timeout=0)
+            while len(pending) > args.max_pending:
+                collect()
+
+        while len(pending) > 0:
+            collect()
+
+    # results are appended as they are solved, once the run is complete they are reported in the question file's order
+    results.sort(key=lambda r: question_order.get(r["question_id"], len(question_order)))
+    with open(f"{results_file}.tmp", "w") as f:
+        f.writelines(json.dumps(result) + "\n" for result in results)
+    os.replace(f"{results_file}.tmp", results_file)
+
+    summary = summarize_results(results)
+    with open(f"{args.output_dir}/summary.json", "w") as f:
+        json.dump(summary, f, indent=4)
+    with open(f"{args.output_dir}/timings.json", "w") as f:
+        json.dump(summarize_stage_timings(results), f, indent=4)
+    print(f"Done: Corr {summary['correct']:7d}, Incorr {summary['incorrect']:7d}, UNSAT {summary['unsat']:7d}, Timeout {summary['timeout']:5d}, Skip {summary['skipped']:5d}, Corr %: {summary['correct_percentage']:.4f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the VQA pipeline on a GQA question file")
+    parser.add_argument("--questions", default="../data/questions/testdev_balanced_questions.json")
+    parser.add_argument("--images", default="../data/images")
+    parser.add_argument("--metadata-dir", default="../data/metadata")
+    parser.add_argument("--theory", default="pipeline/encoding/theory.lp")
+    parser.add_argument("--output-dir", required=True, help="directory for the append-only results file, re-running resumes from it")
+    parser.add_argument("--encoded-dir", default=None, help="if set, the ASP encoding of every question is written there")
+    parser.add_argument("--num-questions", type=int, default=None)
+    parser.add_argument("--model", default="clip", choices=["clip", "blip", "xvlm-vipergpt", "xvlm-itr-coco"])
+    parser.add_argument("--clip-model", default="openai/clip-vit-base-patch32")
+    parser.add_argument("--snapshot", default=None)
+    parser.add_argument("--owl-model", default="google/owlvit-large-patch14")
+    parser.add_argument("--detection-cache-dir", default=None)
+    parser.add_argument("--backend", default="torch", choices=["torch", "int8", "onnx"], help="CPU backend of CLIP and OWL-ViT (int8: dynamically quantized linear layers, onnx: ONNX Runtime)")
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "bf16", "fp16"], help="autocast precision of the VLM and OWL-ViT")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the VLM and OWL-ViT towers")
+    parser.add_argument("--channels-last", action="store_true", help="run the VLM and OWL-ViT on channels-last images")
+    parser.add_argument("--text-bank", action="store_true", help="score against the precomputed text embedding bank of the model")
+    parser.add_argument("--perception-store", default=None, help="directory in which the detections and probabilities of every question are stored")
+    parser.add_argument("--reencode", action="store_true", help="rebuild the encodings from the perception store instead of running the models")
+    parser.add_argument("--store-version", default=None, help="perception key (VLM, detector and lazy or eager perception) to re-encode from, if the perception store has several")
+    parser.add_argument("--lazy-perception", action="store_true", help="only score the objects and object pairs that the question program can look at")
+    parser.add_argument("--encoding", default="direct", choices=["direct", "text"], help="how the scene and question encodings are passed to the solver")
+    parser.add_argument("--batch-size", type=int, default=8, help="minimum number of questions encoded together")
+    parser.add_argument("--no-group-by-image", dest="group_by_image", action="store_false", help="process the questions in file order instead of grouping the questions of an image")
+    parser.add_argument("--group-window", type=int, default=1024, help="number of upcoming questions that are grouped by image")
+    parser.add_argument("--prefetch", type=int, default=32, help="number of upcoming questions whose images are decoded in the background")
+    parser.add_argument("--image-cache-size", type=int, default=64, help="number of decoded images kept in memory")
+    parser.add_argument("--loader-threads", type=int, default=4)
+    parser.add_argument("--gpu-decode", action="store_true", help="decode the JPEGs on the GPU")
+    parser.add_argument("--num-workers", type=int, default=max(1, os.cpu_count() - 1), help="number of ASP solver processes")
+    parser.add_argument("--max-pending", type=int, default=64, help="maximum number of questions waiting for the solver")
+    parser.add_argument("--timeout", type=float, default=10.0, help="solving timeout per question in seconds")
+    parser.add_argument("--report-steps", type=int, default=200)
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
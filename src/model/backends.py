@@ -0,0 +1,65 @@
+import os
+import torch
+from model.inference_mode import map_submodules
+
+# torch: the model as loaded, int8: dynamically quantized linear layers, onnx: towers exported to ONNX Runtime sessions
+BACKENDS = ["torch", "int8", "onnx"]
+
+
+def check_backend(backend, gpu):
+    if backend not in BACKENDS:
+        raise RuntimeError(f"Unsupported backend {backend}!")
+    if backend != "torch" and torch.device(gpu).type != "cpu":
+        raise RuntimeError(f"The {backend} backend only runs on the CPU!")
+
+
+def quantize_linear_layers(model, tower_modules):
+    # dynamic INT8 quantization: the weights of all linear layers of the towers are quantized once, their activations
+    # per batch at runtime
+    return map_submodules(model, tower_modules, lambda module: torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8))
+
+
+class TowerModule(torch.nn.Module):
+    # a tower function of a model as the forward of a module, so that it can be exported
+    def __init__(self, model, fn):
+        super().__init__()
+        self.model = model
+        self.fn = fn
+
+    def forward(self, *inputs):
+        return self.fn(self.model, *inputs)
+
+
+class OnnxTower:
+    # a tower exported to ONNX, run by an ONNX Runtime session and called like the tower function it replaces
+    def __init__(self, path, num_threads=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("The onnx backend needs onnx and onnxruntime, install them with the onnx extra!")
+
+        options = onnxruntime.SessionOptions()
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, **inputs):
+        outputs = self.session.run(None, {name: inputs[name].cpu().numpy() for name in self.input_names})
+        outputs = [torch.from_numpy(output) for output in outputs]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+
+def export_onnx_tower(model, fn, example_inputs, output_names, path):
+    # the tower is only exported if there is no export of it yet, the batch dimension (and the token dimension of texts)
+    # of all inputs stay dynamic
+    if not os.path.isfile(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        dynamic_axes = {name: {0: "batch", 1: "tokens"} if inputs.dim() == 2 else {0: "batch"} for name, inputs in example_inputs.items()}
+        torch.onnx.export(
+            TowerModule(model, fn).eval(), tuple(example_inputs.values()), f"{path}.tmp",
+            input_names=list(example_inputs.keys()), output_names=output_names, dynamic_axes=dynamic_axes, opset_version=17
+        )
+        os.replace(f"{path}.tmp", path)
+
+    return OnnxTower(path)
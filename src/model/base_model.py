@@ -1,9 +1,24 @@
 from abc import ABC, abstractmethod
+from model.inference_mode import InferenceMode
+import torch
 
 class BaseModel(ABC):
-    def __init__(self, img_size, gpu):
+    # (dotted) names of the submodules of self.model that make up the image and text towers
+    tower_modules = []
+
+    def __init__(self, img_size, gpu, version):
         self.img_size = img_size
         self.gpu = gpu
+        self.version = version
+        # normalization of the model's pixel inputs (the CLIP constants, unless the model's image processor says otherwise)
+        self.image_mean = (0.48145466, 0.4578275, 0.40821073)
+        self.image_std = (0.26862954, 0.26130258, 0.27577711)
+        self.inference_mode = InferenceMode()
+
+    def set_inference_mode(self, inference_mode):
+        # the towers enter inference_mode.context themselves, the model only has to be converted/compiled once
+        self.model = inference_mode.prepare_model(self.model, self.tower_modules)
+        self.inference_mode = inference_mode
     
     @abstractmethod
     def preprocess_images(self, images):
@@ -13,9 +28,8 @@ class BaseModel(ABC):
     def preprocess_texts(self, texts):
         pass
 
-    @abstractmethod
     def score(self, images, texts):
-        pass
+        return self.score_features(self.get_image_features(images), self.get_text_features(texts))
 
     @abstractmethod
     def get_image_features(self, images):
@@ -23,4 +37,20 @@ class BaseModel(ABC):
     
     @abstractmethod
     def get_text_features(self, texts):
-        pass
\ No newline at end of file
+        pass
+
+    def get_logit_scale(self):
+        return 1.0
+
+    def score_features(self, image_features, text_features):
+        # (num_images x dim), (num_texts x dim) -> (num_images x num_texts)
+        image_features = image_features / image_features.norm(p=2, dim=-1, keepdim=True)
+        text_features = text_features / text_features.norm(p=2, dim=-1, keepdim=True)
+        return self.get_logit_scale() * image_features @ text_features.t()
+
+    def score_features_paired(self, image_features, text_features):
+        # (num_images x dim), (num_images x num_texts x dim) -> (num_images x num_texts), i.e. every image is only
+        # scored against its own block of texts
+        image_features = image_features / image_features.norm(p=2, dim=-1, keepdim=True)
+        text_features = text_features / text_features.norm(p=2, dim=-1, keepdim=True)
+        return self.get_logit_scale() * torch.einsum("nd,nkd->nk", image_features, text_features)
\ No newline at end of file
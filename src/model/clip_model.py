@@ -1,32 +1,56 @@
 from model.base_model import BaseModel
-from transformers import CLIPModel as TCLIPModel, CLIPImageProcessor, CLIPTokenizer
+from model.backends import check_backend, quantize_linear_layers, export_onnx_tower
+from pipeline.utils import cleanup_whitespace
+from transformers import CLIPModel as TCLIPModel, CLIPImageProcessor, CLIPTokenizer, BatchFeature
+import torch
 
 class CLIPModel(BaseModel):
-    def __init__(self, gpu, model="openai/clip-vit-base-patch32", snapshot=None):
-        super().__init__(img_size=224, gpu=gpu)
+    tower_modules = ["vision_model", "text_model"]
 
-        self.model = TCLIPModel.from_pretrained(snapshot if snapshot is not None else model).to(gpu)
+    def __init__(self, gpu, model="openai/clip-vit-base-patch32", snapshot=None, backend="torch", onnx_dir="../data/models/onnx"):
+        check_backend(backend, gpu)
+        # other backends produce (slightly) different features, e.g. text banks are kept apart by the version
+        name = snapshot if snapshot is not None else model
+        super().__init__(img_size=224, gpu=gpu, version=name if backend == "torch" else f"{name}+{backend}")
+
+        self.model = TCLIPModel.from_pretrained(name).to(gpu)
         self.image_processor = CLIPImageProcessor.from_pretrained(model)
+        self.image_mean, self.image_std = self.image_processor.image_mean, self.image_processor.image_std
         self.tokenizer = CLIPTokenizer.from_pretrained(model)
 
+        self.image_tower, self.text_tower = self.model.get_image_features, self.model.get_text_features
+        if backend == "int8":
+            self.model = quantize_linear_layers(self.model, self.tower_modules)
+        elif backend == "onnx":
+            self.image_tower = export_onnx_tower(
+                self.model, lambda m, pixel_values: m.get_image_features(pixel_values=pixel_values),
+                {"pixel_values": torch.zeros((1, 3, self.img_size, self.img_size))}, ["image_features"],
+                f"{onnx_dir}/{cleanup_whitespace(name)}/image_tower.onnx"
+            )
+            self.text_tower = export_onnx_tower(
+                self.model, lambda m, input_ids, attention_mask: m.get_text_features(input_ids=input_ids, attention_mask=attention_mask),
+                dict(self.preprocess_texts(["a pixelated picture of an object"])), ["text_features"],
+                f"{onnx_dir}/{cleanup_whitespace(name)}/text_tower.onnx"
+            )
+
     def preprocess_images(self, images):
+        # crops from the crop engine are already resized and normalized
+        if torch.is_tensor(images):
+            return BatchFeature({"pixel_values": self.inference_mode.prepare_images(images.to(self.gpu))})
         return self.image_processor(images, return_tensors="pt", do_resize=False, do_center_crop=False).to(self.gpu)
 
     def preprocess_texts(self, texts):
         return self.tokenizer(texts, return_tensors="pt", padding=True).to(self.gpu)
 
-    def score(self, images, texts):
-        image_inputs = self.preprocess_images(images)
-        text_inputs = self.preprocess_texts(texts)
-        
-        result = self.model(**image_inputs, **text_inputs)
-        return result["logits_per_image"]
-    
     def get_image_features(self, images):
-        image_inputs = self.preprocess_images(images)
-        return self.model.get_image_features(**image_inputs)
+        with self.inference_mode.context(self.gpu):
+            image_inputs = self.preprocess_images(images)
+            return self.image_tower(**image_inputs).float()
     
     def get_text_features(self, texts):
-        text_inputs = self.preprocess_texts(texts)
-        return self.model.get_text_features(**text_inputs)
-        
\ No newline at end of file
+        with self.inference_mode.context(self.gpu):
+            text_inputs = self.preprocess_texts(texts)
+            return self.text_tower(**text_inputs).float()
+
+    def get_logit_scale(self):
+        return self.model.logit_scale.exp()
\ No newline at end of file
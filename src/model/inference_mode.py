@@ -0,0 +1,128 @@
+import contextlib
+import torch
+
+PRECISIONS = {"fp32": torch.float32, "bf16": torch.bfloat16, "fp16": torch.float16}
+
+
+def map_submodules(model, names, fn):
+    # replaces the (dotted) submodules of model by fn(submodule)
+    for name in names:
+        parent_name, _, attr = name.rpartition(".")
+        parent = model.get_submodule(parent_name) if parent_name != "" else model
+        setattr(parent, attr, fn(getattr(parent, attr)))
+    return model
+
+
+class InferenceMode:
+    # how the towers of a model are run: autocast precision, torch.compile'd tower modules and channels-last images
+    def __init__(self, precision="fp32", compile=False, channels_last=False):
+        if precision not in PRECISIONS:
+            raise RuntimeError(f"Unsupported precision {precision}!")
+
+        self.precision = precision
+        self.dtype = PRECISIONS[precision]
+        self.compile = compile
+        self.channels_last = channels_last
+
+    def prepare_model(self, model, tower_modules):
+        # tower_modules are the (dotted) names of the submodules the towers call, compiling those instead of the model
+        # itself also covers towers that are not reached through forward (e.g. get_image_features)
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+
+        if self.compile:
+            model = map_submodules(model, tower_modules, torch.compile)
+
+        return model
+
+    def prepare_images(self, images):
+        if self.channels_last and images.dim() == 4:
+            return images.contiguous(memory_format=torch.channels_last)
+        return images
+
+    def context(self, device):
+        # every tower call runs without autograd bookkeeping, and in the lower precision unless fp32
+        stack = contextlib.ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if self.dtype != torch.float32:
+            stack.enter_context(torch.autocast(device_type=torch.device(device).type, dtype=self.dtype))
+        return stack
+
+    def __str__(self):
+        return f"{self.precision}{'+compile' if self.compile else ''}{'+channels_last' if self.channels_last else ''}"
+
+
+def get_logit_drift(reference_logits, logits):
+    # (num_images x num_texts) logits against the reference logits of the same images and texts
+    reference_logits, logits = reference_logits.float().cpu(), logits.float().cpu()
+    diff = (logits - reference_logits).abs()
+    return {
+        "max_abs_diff": diff.max().item(),
+        "mean_abs_diff": diff.mean().item(),
+        "max_rel_diff": (diff / reference_logits.abs().clamp(min=1e-6)).max().item(),
+        "top1_agreement": (logits.argmax(dim=1) == reference_logits.argmax(dim=1)).float().mean().item()
+    }
+
+
+def check_inference_parity(model, crops, texts, inference_mode):
+    # logits of the model in its current (fp32) mode against the logits in inference_mode, on the same crops and texts,
+    # the model is left in inference_mode
+    reference_logits = model.score(crops, texts)
+    model.set_inference_mode(inference_mode)
+    logits = model.score(crops, texts)
+
+    return {
+        "inference_mode": str(inference_mode),
+        "num_crops": len(reference_logits),
+        "num_texts": len(texts),
+        **get_logit_drift(reference_logits, logits)
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import itertools
+    import json
+    import os
+    import sys
+    from torchvision.io import read_image, ImageReadMode
+    from evaluation.runner import load_model
+    from pipeline.image_cropping import crop_images
+    from pipeline.encoding.scene_encoding import get_object_prompt
+
+    parser = argparse.ArgumentParser(description="Compare the logits of an inference mode against fp32 on a fixed crop set")
+    parser.add_argument("--model", default="clip", choices=["clip", "blip", "xvlm-vipergpt", "xvlm-itr-coco"])
+    parser.add_argument("--clip-model", default="openai/clip-vit-base-patch32")
+    parser.add_argument("--snapshot", default=None)
+    parser.add_argument("--images", default="../data/images")
+    parser.add_argument("--metadata-dir", default="../data/metadata")
+    parser.add_argument("--num-images", type=int, default=8)
+    parser.add_argument("--crops-per-image", type=int, default=8)
+    parser.add_argument("--precision", default="bf16", choices=list(PRECISIONS.keys()))
+    parser.add_argument("--compile", action="store_true")
+    parser.add_argument("--channels-last", action="store_true")
+    parser.add_argument("--max-abs-diff", type=float, default=None, help="exit with an error if the logits differ by more")
+    args = parser.parse_args()
+
+    gpu = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
+    model = load_model(args, gpu)
+
+    with open(f"{args.metadata_dir}/gqa_all_class.json") as f:
+        all_classes = json.load(f)
+        texts = [get_object_prompt(c.replace("_", " ")) for c in itertools.chain(*all_classes.values())]
+
+    # the crop set is fixed by the seed: random boxes on the first images of the image directory
+    generator = torch.Generator().manual_seed(0)
+    crops = []
+    for image_file in sorted(os.listdir(args.images))[:args.num_images]:
+        image = read_image(f"{args.images}/{image_file}", ImageReadMode.RGB)
+        h, w = image.shape[1], image.shape[2]
+        y1, x1 = torch.rand(args.crops_per_image, generator=generator)*h*0.75, torch.rand(args.crops_per_image, generator=generator)*w*0.75
+        y2, x2 = y1 + (h - y1)*torch.rand(args.crops_per_image, generator=generator).clamp(min=0.1), x1 + (w - x1)*torch.rand(args.crops_per_image, generator=generator).clamp(min=0.1)
+        crops.append(crop_images(image, torch.stack([y1, x1, y2, x2], dim=1).numpy(), model))
+
+    report = check_inference_parity(model, torch.cat(crops), texts, InferenceMode(args.precision, args.compile, args.channels_last))
+    print(json.dumps(report, indent=4))
+
+    if args.max_abs_diff is not None and report["max_abs_diff"] > args.max_abs_diff:
+        sys.exit(1)
@@ -7,8 +7,10 @@ from PIL import Image
 import re
 
 class XVLMModel(BaseModel):
+    tower_modules = ["vision_encoder", "text_encoder"]
+
     def __init__(self, gpu):
-        super().__init__(img_size=384, gpu=gpu)
+        super().__init__(img_size=384, gpu=gpu, version="xvlm_vipergpt/retrieval_mscoco_checkpoint_9")
 
         self.max_words = 30
         config_xvlm = {
@@ -68,9 +70,13 @@ class XVLMModel(BaseModel):
         return caption
 
     def preprocess_images(self, images):
-        images = [self.transform(image) for image in images]
-        images = torch.stack(images, dim=0).to(self.gpu)
-        image_embeds, _ = self.model.get_vision_embeds(images)
+        # crops from the crop engine are already resized and normalized
+        if torch.is_tensor(images):
+            images = images.to(self.gpu)
+        else:
+            images = [self.transform(image) for image in images]
+            images = torch.stack(images, dim=0).to(self.gpu)
+        image_embeds, _ = self.model.get_vision_embeds(self.inference_mode.prepare_images(images))
         return image_embeds
 
     def preprocess_texts(self, texts):
@@ -80,17 +86,12 @@ class XVLMModel(BaseModel):
         text_embeds = self.model.get_text_embeds(text_ids, text_atts)
         return text_embeds
 
-    def score(self, images, texts):
-        text_inputs = self.preprocess_texts(texts)
-        image_inputs = self.preprocess_images(images)
-
-        image_feat, text_feat = self.model.get_features(image_inputs, text_inputs)
-        return image_feat @ text_feat.t()
-    
     def get_image_features(self, images):
-        image_inputs = self.preprocess_images(images)
-        return self.model.get_features(image_embeds=image_inputs)
+        with self.inference_mode.context(self.gpu):
+            image_inputs = self.preprocess_images(images)
+            return self.model.get_features(image_embeds=image_inputs).float()
     
     def get_text_features(self, texts):
-        text_inputs = self.preprocess_texts(texts)
-        return self.model.get_features(text_embeds=text_inputs)
\ No newline at end of file
+        with self.inference_mode.context(self.gpu):
+            text_inputs = self.preprocess_texts(texts)
+            return self.model.get_features(text_embeds=text_inputs).float()
\ No newline at end of file
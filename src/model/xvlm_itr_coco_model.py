@@ -8,8 +8,10 @@ import torch
 import torch.nn.functional as F
 
 class XVLMModel(BaseModel):
+    tower_modules = ["vision_encoder", "text_encoder"]
+
     def __init__(self, gpu):
-        super().__init__(img_size=384, gpu=gpu)
+        super().__init__(img_size=384, gpu=gpu, version="xvlm_original_4m/itr_coco")
 
         self.config = yaml.load(open("../externals/x_vlm/configs/config_xvlm_itr_coco.yaml", "r"), Loader=yaml.Loader)
 
@@ -29,28 +31,29 @@ class XVLMModel(BaseModel):
         ])
 
     def preprocess_images(self, images):
-        images = [self.image_transform(image) for image in images]
-        images = torch.stack(images, dim=0).to(self.gpu)
-        return  self.model.vision_encoder(self.image_transform(images))
+        # crops from the crop engine are already resized and normalized, the image_transform below is applied on top of
+        # that on purpose: the original implementation transformed every image twice (/255 and Normalize each time) and
+        # the model is kept scoring exactly like it, dropping the second transform would change all its scores
+        if torch.is_tensor(images):
+            images = images.to(self.gpu)
+        else:
+            images = [self.image_transform(image) for image in images]
+            images = torch.stack(images, dim=0).to(self.gpu)
+        return  self.model.vision_encoder(self.inference_mode.prepare_images(self.image_transform(images)))
 
     def preprocess_texts(self, texts):
         return self.tokenizer(texts, padding='max_length', truncation=True, max_length=self.config['max_tokens'], return_tensors="pt").to(self.gpu)
 
-    def score(self, images, texts):
-        image_embeds = self.get_image_features(images)
-        text_embeds = self.get_text_features(texts)
-        
-        return image_embeds @ text_embeds.t()
-    
     def get_image_features(self, images):
-        image_inputs = self.preprocess_images(images)
-        image_embed = self.model.vision_proj(image_inputs[:, 0, :])
-        return F.normalize(image_embed, dim=-1)
+        with self.inference_mode.context(self.gpu):
+            image_inputs = self.preprocess_images(images)
+            image_embed = self.model.vision_proj(image_inputs[:, 0, :])
+            return F.normalize(image_embed, dim=-1).float()
     
     def get_text_features(self, texts):
-        text_inputs = self.preprocess_texts(texts)
-        text_output = self.model.text_encoder(text_inputs.input_ids, attention_mask=text_inputs.attention_mask, mode='text')
-        text_feat = text_output.last_hidden_state
-        text_embed = F.normalize(self.model.text_proj(text_feat[:, 0, :]))
-        return text_embed
-        
\ No newline at end of file
+        with self.inference_mode.context(self.gpu):
+            text_inputs = self.preprocess_texts(texts)
+            text_output = self.model.text_encoder(text_inputs.input_ids, attention_mask=text_inputs.attention_mask, mode='text')
+            text_feat = text_output.last_hidden_state
+            text_embed = F.normalize(self.model.text_proj(text_feat[:, 0, :]))
+            return text_embed.float()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import torch
+from torchvision.ops import box_iou
+from object_detection.detections import Detections
+
+
+class CategoryIndex:
+    # class name -> multi-hot vector of all categories it belongs to, built once instead of scanning all_classes per pair
+    def __init__(self, all_classes):
+        self.num_categories = len(all_classes)
+        self.categories = {}
+        for c, category in enumerate(all_classes):
+            for name in all_classes[category]:
+                self.categories.setdefault(name, []).append(c)
+
+    def get_category_matrix(self, detections):
+        labels, label_indices = torch.unique(detections.labels, return_inverse=True)
+        categories = torch.zeros((len(labels), self.num_categories))
+        for i, label in enumerate(labels.tolist()):
+            categories[i, self.categories.get(detections.vocabulary[label], [])] = 1
+        return categories[label_indices]
+
+
+def merge_overlapping_objects(detections, overlap_threshold):
+    # greedy merge of detections of the same class, every detection is merged into the first later one it overlaps with
+    if len(detections) < 2:
+        return detections
+
+    boxes, scores, labels = detections.boxes.clone(), detections.scores.clone(), detections.labels
+    same_label = labels[:, None] == labels[None, :]
+    corner_boxes = detections.get_corner_boxes()
+    overlaps = torch.triu((box_iou(corner_boxes, corner_boxes) > overlap_threshold) & same_label, diagonal=1)
+    has_overlap = overlaps.any(dim=1).tolist()
+    removed = torch.zeros(len(detections), dtype=torch.bool)
+
+    for k in range(len(detections)):
+        if not has_overlap[k]:
+            continue
+
+        l = k + 1 + int(overlaps[k, k+1:].nonzero()[0, 0])
+        (xk, yk, wk, hk), (xl, yl, wl, hl) = boxes[k].tolist(), boxes[l].tolist()
+        y, x = min(yk, yl), min(xk, xl)
+        y2, x2 = max(yk+hk, yl+hl), max(xk+wk, xl+wl)
+
+        removed[k] = True
+        boxes[l] = torch.tensor([x, y, x2-x, y2-y], dtype=torch.float64)
+        scores[l] = torch.maximum(scores[k], scores[l])
+
+        # only the overlaps of the grown box with the detections that have not been visited yet change
+        corner_boxes[l] = torch.tensor([x, y, x + (x2-x), y + (y2-y)], dtype=torch.float64)
+        overlaps[k+1:l, l] = (box_iou(corner_boxes[k+1:l], corner_boxes[l:l+1])[:, 0] > overlap_threshold) & same_label[k+1:l, l]
+        overlaps[l, l+1:] = (box_iou(corner_boxes[l:l+1], corner_boxes[l+1:])[0] > overlap_threshold) & same_label[l, l+1:]
+        has_overlap[k+1:l] = overlaps[k+1:l].any(dim=1).tolist()
+        has_overlap[l] = bool(overlaps[l].any())
+
+    return Detections(boxes, scores, labels, detections.vocabulary)[~removed]
+
+
+def remove_duplicate_objects(detections_a, detections_b, category_index, overlap_threshold=0.7):
+    # drops the detections of b that overlap with a detection of a which shares at least one category with it
+    if len(detections_a) == 0 or len(detections_b) == 0:
+        return detections_b
+
+    shared_category = category_index.get_category_matrix(detections_b) @ category_index.get_category_matrix(detections_a).T > 0
+    is_duplicate = ((box_iou(detections_b.get_corner_boxes(), detections_a.get_corner_boxes()) > overlap_threshold) & shared_category).any(dim=1)
+    return detections_b[~is_duplicate]
@@ -0,0 +1,54 @@
+import os
+from collections import OrderedDict
+import torch
+from pipeline.utils import cleanup_whitespace
+
+
+class DetectionCache:
+    # entries are kept apart by the key of the detector that produced them (model, backend, precision), in memory and
+    # on disk, so that a cache directory can be reused with another detector
+    def __init__(self, max_images=32, cache_dir=None):
+        self.max_images = max_images
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+
+        if cache_dir is not None and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def __cache_file__(self, key, image_id):
+        return f"{self.cache_dir}/{cleanup_whitespace(key)}/{image_id}.pt"
+
+    def get(self, key, image_id):
+        if (key, image_id) in self.entries:
+            self.entries.move_to_end((key, image_id))
+            return self.entries[(key, image_id)]
+
+        if self.cache_dir is not None and os.path.isfile(self.__cache_file__(key, image_id)):
+            entry = torch.load(self.__cache_file__(key, image_id))
+            self.__insert__(key, image_id, entry)
+            return entry
+
+        return None
+
+    def update(self, key, image_id, boxes, logits):
+        # boxes are the raw (per patch) OWL-ViT boxes, logits map each text query to its per patch logits
+        entry = self.get(key, image_id)
+        if entry is None:
+            entry = {"boxes": boxes, "logits": {}}
+        entry["logits"].update(logits)
+        self.__insert__(key, image_id, entry)
+
+        if self.cache_dir is not None:
+            os.makedirs(os.path.dirname(self.__cache_file__(key, image_id)), exist_ok=True)
+            torch.save(entry, self.__cache_file__(key, image_id))
+
+        return entry
+
+    def __insert__(self, key, image_id, entry):
+        self.entries[(key, image_id)] = entry
+        self.entries.move_to_end((key, image_id))
+        while len(self.entries) > self.max_images:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
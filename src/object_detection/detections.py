@@ -0,0 +1,95 @@
+import torch
+
+
+class LabelVocabulary:
+    # class names of detections, shared by all detections of a detector so that label ids can be compared and concatenated
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def get_ids(self, names):
+        for name in names:
+            if name not in self.ids:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+        return [self.ids[name] for name in names]
+
+    def __getitem__(self, label):
+        return self.names[label]
+
+    def __len__(self):
+        return len(self.names)
+
+
+class Detections:
+    # detected objects of one image: boxes (N x 4, as x, y, w, h in pixels), scores (N) and label ids (N) into a vocabulary
+    def __init__(self, boxes, scores, labels, vocabulary):
+        self.boxes = boxes.to(torch.float64).reshape(-1, 4)
+        self.scores = scores.to(torch.float64).reshape(-1)
+        self.labels = labels.to(torch.long).reshape(-1)
+        self.vocabulary = vocabulary
+
+    @staticmethod
+    def empty(vocabulary):
+        return Detections(torch.zeros((0, 4)), torch.zeros(0), torch.zeros(0), vocabulary)
+
+    @staticmethod
+    def from_objects(objects, vocabulary):
+        return Detections(
+            torch.tensor([(o['x'], o['y'], o['w'], o['h']) for o in objects], dtype=torch.float64),
+            torch.tensor([o['score'] for o in objects], dtype=torch.float64),
+            torch.tensor(vocabulary.get_ids([o['name'] for o in objects])),
+            vocabulary
+        )
+
+    @staticmethod
+    def cat(detections):
+        vocabulary = detections[0].vocabulary
+        if any(d.vocabulary is not vocabulary for d in detections):
+            raise RuntimeError("Only detections with the same vocabulary can be concatenated!")
+
+        return Detections(
+            torch.cat([d.boxes for d in detections]),
+            torch.cat([d.scores for d in detections]),
+            torch.cat([d.labels for d in detections]),
+            vocabulary
+        )
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, index):
+        # a single detection as object dict, anything else (slices, index tensors, masks) as detections
+        if isinstance(index, int):
+            return self.to_objects()[index]
+        return Detections(self.boxes[index], self.scores[index], self.labels[index], self.vocabulary)
+
+    def __iter__(self):
+        return iter(self.to_objects())
+
+    @property
+    def names(self):
+        return [self.vocabulary[label] for label in self.labels.tolist()]
+
+    def to_objects(self):
+        return [
+            {"x": x, "y": y, "w": w, "h": h, "score": score, "name": name}
+            for (x, y, w, h), score, name in zip(self.boxes.tolist(), self.scores.tolist(), self.names)
+        ]
+
+    def get_corner_boxes(self):
+        # (x1, y1, x2, y2) boxes, e.g. for torchvision.ops
+        x, y, w, h = self.boxes.unbind(dim=1)
+        return torch.stack([x, y, x+w, y+h], dim=1)
+
+    def top_k(self, k):
+        # the k highest scoring detections, ties keep their detection order
+        order = torch.sort(self.scores, descending=True, stable=True).indices
+        return self[order[:k]]
+
+    def get_positions(self, image_size):
+        # horizontal/vertical position of every box center in thirds of the image
+        x, y, w, h = self.boxes.unbind(dim=1)
+        hposition = torch.bucketize(x + w/2, torch.tensor([image_size["w"]/3, image_size["w"]/3*2], dtype=torch.float64))
+        vposition = torch.bucketize(y + h/2, torch.tensor([image_size["h"]/3, image_size["h"]/3*2], dtype=torch.float64))
+        return [["left", "middle", "right"][p] for p in hposition.tolist()], [["top", "middle", "bottom"][p] for p in vposition.tolist()]
@@ -1,9 +1,12 @@
 from abc import ABC, abstractmethod
+from object_detection.detections import LabelVocabulary
 
 class BaseObjectDetector(ABC):
     def __init__(self, gpu):
         self.gpu = gpu
+        # all detections of the detector share one vocabulary, so that they can be merged and concatenated by label id
+        self.vocabulary = LabelVocabulary()
     
     @abstractmethod
-    def detect_objects(self, image, classes, threshold, k):
+    def detect_objects(self, image, classes, threshold, k, image_id=None):
         pass
\ No newline at end of file
@@ -1,97 +1,182 @@
 import torch
+from collections import OrderedDict
 from transformers import AutoProcessor, AutoModelForZeroShotObjectDetection
+from transformers.models.owlvit.modeling_owlvit import OwlViTObjectDetectionOutput
 import torchvision.transforms.functional as F
 
 from object_detection.object_detector import BaseObjectDetector
+from object_detection.box_merging import merge_overlapping_objects
+from object_detection.detections import Detections
+from model.inference_mode import InferenceMode
+from model.backends import check_backend, quantize_linear_layers, export_onnx_tower
+from pipeline.utils import cleanup_whitespace
+from pipeline.instrumentation import stage, count
+
+
+def __embed_pixels__(model, pixel_values):
+    # image encoder and box head, independent of any text query
+    feature_map = model.image_embedder(pixel_values=pixel_values)[0]
+
+    batch_size, num_patches_height, num_patches_width, hidden_dim = feature_map.shape
+    image_feats = torch.reshape(feature_map, (batch_size, num_patches_height * num_patches_width, hidden_dim))
+    boxes = model.box_predictor(image_feats, feature_map)
+    return image_feats, boxes
+
+
+def __embed_texts__(model, input_ids, attention_mask):
+    text_outputs = model.owlvit.text_model(input_ids=input_ids, attention_mask=attention_mask)
+    text_embeds = model.owlvit.text_projection(text_outputs[1])
+    return text_embeds / torch.linalg.norm(text_embeds, ord=2, dim=-1, keepdim=True)
 
 
 class OWLViTObjectDetector(BaseObjectDetector):
-    def __init__(self, gpu, model="google/owlvit-large-patch14"):
+    # (dotted) names of the submodules that embed_image and embed_text_queries run
+    tower_modules = ["owlvit.vision_model", "owlvit.text_model"]
+
+    def __init__(self, gpu, model="google/owlvit-large-patch14", cache=None, max_image_embeddings=4, backend="torch", onnx_dir="../data/models/onnx"):
         super().__init__(gpu)
+        check_backend(backend, gpu)
 
         self.model = AutoModelForZeroShotObjectDetection.from_pretrained(model).to(gpu)
         self.processor = AutoProcessor.from_pretrained(model)
-
-    def __should_merge__(self, box1, box2, overlap_threshold):
-        YA1, XA1, YA2, XA2 = box1 
-        YB1, XB1, YB2, XB2 = box2
-        box1_area = (YA2 - YA1) * (XA2 - XA1)
-        box2_area = (YB2 - YB1) * (XB2 - XB1)
-        intersection_area = max(0, min(XA2, XB2) - max(XA1, XB1)) * max(0, min(YA2, YB2) - max(YA1, YB1))
-        union_area = box1_area + box2_area - intersection_area
-
-        if intersection_area / union_area > overlap_threshold:
-            return True, (
-                min(box1[0], box2[0]),
-                min(box1[1], box2[1]),
-                max(box1[2], box2[2]),
-                max(box1[3], box2[3]),
+        self.model_name = model
+        self.backend = backend
+        self.cache = cache
+
+        self.image_tower = lambda pixel_values: __embed_pixels__(self.model, pixel_values)
+        self.text_tower = lambda input_ids, attention_mask: __embed_texts__(self.model, input_ids, attention_mask)
+        if backend == "int8":
+            self.model = quantize_linear_layers(self.model, self.tower_modules)
+        elif backend == "onnx":
+            size = self.processor.image_processor.size
+            self.image_tower = export_onnx_tower(
+                self.model, __embed_pixels__, {"pixel_values": torch.zeros((1, 3, size["height"], size["width"]))}, ["image_feats", "boxes"],
+                f"{onnx_dir}/{cleanup_whitespace(model)}/image_tower.onnx"
+            )
+            text_inputs = self.processor(text=["a photo of an object"], return_tensors="pt")
+            self.text_tower = export_onnx_tower(
+                self.model, __embed_texts__, {"input_ids": text_inputs["input_ids"], "attention_mask": text_inputs["attention_mask"]}, ["text_embeds"],
+                f"{onnx_dir}/{cleanup_whitespace(model)}/text_tower.onnx"
             )
 
-        return False, None
+        self.max_image_embeddings = max_image_embeddings
+        self.image_embeddings = OrderedDict()
+        self.query_embeddings = {}
+        self.inference_mode = InferenceMode()
+
+    @property
+    def cache_key(self):
+        # detections of another model, backend or precision are not interchangeable
+        return f"{self.model_name}+{self.backend}+{self.inference_mode.precision}"
+
+    def set_inference_mode(self, inference_mode):
+        self.model = inference_mode.prepare_model(self.model, self.tower_modules)
+        self.inference_mode = inference_mode
+        # embeddings computed in the previous mode are dropped
+        self.image_embeddings.clear()
+        self.query_embeddings.clear()
 
     def __merge_objects__(self, objects, overlap_threshold):
-        for k in range(len(objects)):
-            object1 = objects[k]
-            for l in range(k+1, len(objects)):
-                object2 = objects[l]
-                if object1["name"] == object2["name"]:
-                    is_merge, new_box = self.__should_merge__(
-                        (object1['y'], object1['x'], object1['y']+object1['h'], object1['x']+object1['w']), 
-                        (object2['y'], object2['x'], object2['y']+object2['h'], object2['x']+object2['w']), overlap_threshold
-                    )
-                    if is_merge:
-                        objects[k] = None
-                        objects[l] = {
-                            "y": new_box[0],
-                            "x": new_box[1],
-                            "h": new_box[2]-new_box[0],
-                            "w": new_box[3]-new_box[1],
-                            "name": object1["name"],
-                            "score": max(object1["score"], object2["score"])
-                        }
-                        break
-
-        return [b for b in objects if b]
+        return merge_overlapping_objects(objects, overlap_threshold)
 
     def __choose_top_k_objects__(self, objects, k):
-        return sorted(objects, key=lambda o: o["score"], reverse=True)[:k]
+        return objects.top_k(k)
 
     @torch.no_grad()
-    def detect_objects(self, image, classes, threshold=0.1, k=20):
+    @stage("owl_image_embedding")
+    def embed_image(self, image):
+        # first stage: run the image encoder and box head once, independent of any text query
+        inputs = self.processor(images=F.to_pil_image(image.cpu()), return_tensors="pt").to(self.gpu)
+        with self.inference_mode.context(self.gpu):
+            image_feats, boxes = self.image_tower(pixel_values=self.inference_mode.prepare_images(inputs["pixel_values"]))
+
+        del inputs
+        return {"image_feats": image_feats.to(self.gpu), "boxes": boxes[0].float().to("cpu")}
+
+    @torch.no_grad()
+    @stage("owl_text_embedding")
+    def embed_text_queries(self, text_queries):
+        missing_queries = [q for q in dict.fromkeys(text_queries) if q not in self.query_embeddings]
+        if len(missing_queries) > 0:
+            inputs = self.processor(text=missing_queries, return_tensors="pt").to(self.gpu)
+            with self.inference_mode.context(self.gpu):
+                text_embeds = self.text_tower(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]).to(self.gpu)
+
+            for query, text_embed in zip(missing_queries, text_embeds):
+                self.query_embeddings[query] = text_embed
+            del inputs
+
+        return torch.stack([self.query_embeddings[q] for q in text_queries])
+
+    @torch.no_grad()
+    @stage("owl_class_head")
+    def score_queries(self, image_embedding, text_queries):
+        # second stage: only the class head is evaluated for the (cached) query embeddings
+        query_embeds = self.embed_text_queries(text_queries)
+        with self.inference_mode.context(self.gpu):
+            logits, _ = self.model.class_predictor(image_embedding["image_feats"], query_embeds[None])
+        return logits[0].float().to("cpu")
+
+    def __get_image_embedding__(self, image, image_id):
+        if image_id is None:
+            return self.embed_image(image)
+
+        if image_id not in self.image_embeddings:
+            self.image_embeddings[image_id] = self.embed_image(image)
+            while len(self.image_embeddings) > self.max_image_embeddings:
+                self.image_embeddings.popitem(last=False)
+        self.image_embeddings.move_to_end(image_id)
+        return self.image_embeddings[image_id]
+
+    def __predict__(self, image, text_queries, image_id):
+        image_embedding = self.__get_image_embedding__(image, image_id)
+        logits = self.score_queries(image_embedding, text_queries)
+
+        return image_embedding["boxes"], {query: logits[:, i] for i, query in enumerate(text_queries)}
+
+    def __get_predictions__(self, image, text_queries, image_id):
+        entry = self.cache.get(self.cache_key, image_id) if self.cache is not None and image_id is not None else None
+
+        # the logits of every text query are independent of the other queries, so only unseen ones need the model
+        missing_queries = list(dict.fromkeys(q for q in text_queries if entry is None or q not in entry["logits"]))
+        if len(missing_queries) > 0:
+            boxes, logits = self.__predict__(image, missing_queries, image_id)
+            if self.cache is not None and image_id is not None:
+                entry = self.cache.update(self.cache_key, image_id, boxes, logits)
+            else:
+                entry = {"boxes": boxes, "logits": logits}
+
+        return entry["boxes"], torch.stack([entry["logits"][q] for q in text_queries], dim=-1)
+
+    def detect_objects(self, image, classes, threshold=0.1, k=20, image_id=None):
         text_queries = classes
-        inputs = self.processor(text=text_queries, images=F.to_pil_image(image), return_tensors="pt").to(self.gpu)
-
-        outputs = self.model(**inputs)
-        outputs.logits = outputs.logits.to("cpu")
-        outputs.pred_boxes = outputs.pred_boxes.to("cpu")
-
-        target_sizes = torch.tensor([(image.shape[1], image.shape[2])])
-        results = self.processor.post_process_object_detection(outputs, threshold=threshold, target_sizes=target_sizes)[0]
-    
-        scores = results["scores"].tolist()
-        labels = results["labels"].tolist()
-        boxes = results["boxes"].tolist()
-
-        detected_objects = []
-        for i, (box, score, label) in enumerate(zip(boxes, scores, labels)):
-            xmin, ymin, xmax, ymax = box
-            detected_objects.append({
-                "x": xmin,
-                "y": ymin,
-                "w": xmax - xmin,
-                "h": ymax - ymin,
-                "score": score,
-                "name": text_queries[label]
-            })
-
-        merged_objects = self.__merge_objects__(detected_objects, overlap_threshold=0.6)
+        boxes, logits = self.__get_predictions__(image, text_queries, image_id)
+
+        with stage("owl_postprocessing"):
+            outputs = OwlViTObjectDetectionOutput(logits=logits[None], pred_boxes=boxes[None])
+            target_sizes = torch.tensor([(image.shape[1], image.shape[2])])
+            results = self.processor.post_process_object_detection(outputs, threshold=threshold, target_sizes=target_sizes)[0]
+        
+            # labels index the queries of this call, they are mapped to the detector's shared vocabulary
+            query_labels = torch.tensor(self.vocabulary.get_ids(text_queries), dtype=torch.long)
+            xmin, ymin, xmax, ymax = results["boxes"].to(torch.float64).unbind(dim=1)
+            detected_objects = Detections(
+                torch.stack([xmin, ymin, xmax - xmin, ymax - ymin], dim=1),
+                results["scores"],
+                query_labels[results["labels"]],
+                self.vocabulary
+            )
+
+        with stage("box_merging"):
+            merged_objects = self.__merge_objects__(detected_objects, overlap_threshold=0.6)
 
         if k is not None:
             top_k_objects = self.__choose_top_k_objects__(merged_objects, k)
         else:
             top_k_objects = merged_objects
 
-        del inputs, outputs, results
+        del outputs, results
 
+        count("detector_calls")
+        count("raw_detections", len(detected_objects))
         return top_k_objects
\ No newline at end of file
@@ -1,27 +1,27 @@
-from math import tanh, exp
 import numpy as np
+from pipeline.instrumentation import stage, count
 
 
 def scaling(x, ceiling=3):
-    return (1 - tanh(x * 2)) * ceiling
+    return (1 - np.tanh(x * 2)) * ceiling
 
 
+@stage("object_bboxes")
 def get_object_bboxes(objects, img_size, padding_scale_ceiling=1):
+    # padded (y1, x1, y2, x2) crop box of every detection, as an (N, 4) array
     img_width = img_size['w'] - 1
     img_height = img_size['h'] - 1
 
-    bboxes = []
-    for object in objects:
-        padding_w = scaling(object['w'] / img_width, padding_scale_ceiling) * object['w']
-        padding_h = scaling(object['h'] / img_height, padding_scale_ceiling) * object['h']
+    x, y, w, h = objects.boxes.numpy().T
+    padding_w = scaling(w / img_width, padding_scale_ceiling) * w
+    padding_h = scaling(h / img_height, padding_scale_ceiling) * h
 
-        bboxes.append((
-            max(object['y'] - padding_h, 0),
-            max(object['x'] - padding_w, 0),
-            min(object['y']+object['h']+padding_h, img_height),
-            min(object['x']+object['w']+padding_h, img_width)
-        ))
-    return bboxes
+    return np.stack([
+        np.maximum(y - padding_h, 0),
+        np.maximum(x - padding_w, 0),
+        np.minimum(y+h+padding_h, img_height),
+        np.minimum(x+w+padding_h, img_width)
+    ], axis=1)
 
 def should_merge(box1, box2, overlap_threshold):
     YA1, XA1, YA2, XA2 = box1 
@@ -41,41 +41,74 @@ def should_merge(box1, box2, overlap_threshold):
 
     return False, None
 
+def get_box_ious(box, boxes, box_area, boxes_area):
+    # IoU of one (y1, x1, y2, x2) box with an array of boxes, computed in the same way as should_merge
+    intersection_w = np.maximum(0, np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]))
+    intersection_h = np.maximum(0, np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]))
+    intersection_area = intersection_w * intersection_h
+    return intersection_area / (box_area + boxes_area - intersection_area)
+
+@stage("pair_bbox_merging")
+def merge_box_array(boxes, overlap_threshold):
+    # greedy merge on an (N, 4) array: every box is merged into the first later box it overlaps with,
+    # returns the remaining boxes and, for every input box, the index of the box it ended up in
+    boxes = boxes.copy()
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    num_boxes = len(boxes)
+    targets = np.arange(num_boxes)
+    removed = np.zeros(num_boxes, dtype=bool)
+
+    # the IoUs are computed row by row instead of as one matrix like in merge_overlapping_objects: at the pipeline's
+    # thresholds nearly every pair box is merged, so hardly any row could be skipped and the row of every grown box
+    # would have to be computed again anyway
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for k in range(num_boxes - 1):
+            candidates = np.flatnonzero(get_box_ious(boxes[k], boxes[k+1:], areas[k], areas[k+1:]) > overlap_threshold)
+            if len(candidates) > 0:
+                l = k + 1 + candidates[0]
+                boxes[l, :2] = np.minimum(boxes[k, :2], boxes[l, :2])
+                boxes[l, 2:] = np.maximum(boxes[k, 2:], boxes[l, 2:])
+                areas[l] = (boxes[l, 2] - boxes[l, 0]) * (boxes[l, 3] - boxes[l, 1])
+                targets[targets == k] = l
+                removed[k] = True
+
+    remaining = np.flatnonzero(~removed)
+    box_indices = np.cumsum(~removed) - 1
+    return boxes[remaining], box_indices[targets]
+
 def merge_boxes(boxes, overlap_threshold):
-    for k in range(len(boxes)):
-        indices1, box1 = boxes[k]
-        for l in range(k+1, len(boxes)):
-            indices2, box2 = boxes[l]
-            is_merge, new_box = should_merge(box1, box2, overlap_threshold)
-            if is_merge:
-                boxes[k] = None
-                boxes[l] = (indices1.union(indices2), new_box)
-                break
-
-    boxes = [b for b in boxes if b]
-    return boxes 
+    if len(boxes) == 0:
+        return []
+
+    merged_boxes, box_indices = merge_box_array(np.array([box for _, box in boxes]), overlap_threshold)
+    merged_indices = [set() for _ in range(len(merged_boxes))]
+    for (indices, _), k in zip(boxes, box_indices):
+        merged_indices[k].update(indices)
+    return [(indices, tuple(box)) for indices, box in zip(merged_indices, merged_boxes.tolist())]
 
+@stage("pair_bboxes")
 def get_pair_bboxes(objects, merge_threshold = 0.7):
     num_objects = len(objects)
     bbox_indices = np.full([num_objects, num_objects], -1)
-    
-    joined_bboxes = []
-    for i in range(num_objects):
-        for j in range(i+1, num_objects):
-            object1 = objects[i]
-            object2 = objects[j]
-
-            joined_bboxes.append(({(i,j)}, (
-                min(object1['y'], object2['y']),
-                min(object1['x'], object2['x']),
-                max(object1['y'] + object1['h'], object2['y'] + object2['h']),
-                max(object1['x'] + object1['w'], object2['x'] + object2['w']),
-            )))
-
-    merged_boxes = merge_boxes(joined_bboxes, merge_threshold)
-    for k, (indices, _) in enumerate(merged_boxes):
-        for i,j in indices:
-            bbox_indices[i,j] = k
-            bbox_indices[j,i] = k
-
-    return [box for _, box in merged_boxes], bbox_indices
\ No newline at end of file
+    if num_objects < 2:
+        return [], bbox_indices
+
+    x1, y1, w, h = objects.boxes.numpy().T
+    y2 = y1 + h
+    x2 = x1 + w
+
+    # joined box of every unordered pair (i < j), in row-major order
+    i, j = np.triu_indices(num_objects, 1)
+    joined_bboxes = np.stack([
+        np.minimum(y1[i], y1[j]),
+        np.minimum(x1[i], x1[j]),
+        np.maximum(y2[i], y2[j]),
+        np.maximum(x2[i], x2[j]),
+    ], axis=1)
+
+    merged_bboxes, pair_indices = merge_box_array(joined_bboxes, merge_threshold)
+    bbox_indices[i, j] = pair_indices
+    bbox_indices[j, i] = pair_indices
+
+    count("merged_pair_bboxes", len(merged_bboxes))
+    return [tuple(box) for box in merged_bboxes.tolist()], bbox_indices
\ No newline at end of file
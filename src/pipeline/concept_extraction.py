@@ -93,4 +93,70 @@ def extract_relations(question):
             relations.add(operation['argument'].split(',')[1].split('|')[1])
         elif operation['operation'] == 'verify rel':
             relations.add(operation['argument'].split(',')[1])
-    return {sanitize(r) for r in relations}
\ No newline at end of file
+    return {sanitize(r) for r in relations}
+
+def __union_classes__(a, b):
+    # None stands for "objects of any class"
+    return None if a is None or b is None else a | b
+
+
+def __reads_attributes__(operation):
+    op = operation['operation']
+    if op == 'relate':
+        return operation['argument'].split(',')[1].startswith('same ')
+    if op == 'query':
+        return operation['argument'] not in ['name', 'hposition', 'vposition']
+    return op == 'common' or \
+           (op.startswith('filter') or op.startswith('verify') or op.startswith('choose') or \
+            op.startswith('same') or op.startswith('different')) and op not in ['verify rel', 'choose rel']
+
+
+def extract_perception_plan(question):
+    # class-level data flow of the question program: which classes the objects of every step can have, and from that
+    # the objects that can appear in any step at all, the objects whose attributes are read and the (subject, object)
+    # pairs whose relations are read
+    step_classes = []
+    plan = {
+        "object_classes": set(),
+        "attribute_classes": set(),
+        "relation_pairs": []
+    }
+
+    for operation in question['semantic']:
+        op = operation['operation']
+        # operations without dependencies start from the whole scene
+        inputs = [step_classes[d] for d in operation['dependencies']] if len(operation['dependencies']) > 0 else [None]
+        # terminal operations (query, verify, exist, and, ...) do not pass objects on
+        outputs = set()
+
+        if op == 'select':
+            outputs = {sanitize_asp(operation['argument'].split('(')[0])}
+        elif op in ['relate', 'verify rel', 'choose rel']:
+            target_class = sanitize_asp(operation['argument'].split(',')[0])
+            target = None if target_class == '_' else {target_class}
+            if op == 'relate':
+                outputs = target
+            if not operation['argument'].split(',')[1].startswith('same '):
+                if operation['argument'].split(',')[2].startswith('s'):
+                    plan["relation_pairs"].append((target, inputs[0]))
+                else:
+                    plan["relation_pairs"].append((inputs[0], target))
+            plan["object_classes"] = __union_classes__(plan["object_classes"], target)
+        elif op.startswith('filter'):
+            outputs = inputs[0]
+        elif op.startswith('choose') and operation['argument'] == '':
+            outputs = __union_classes__(inputs[0], inputs[1])
+
+        if op != 'select':
+            for classes in inputs:
+                plan["object_classes"] = __union_classes__(plan["object_classes"], classes)
+        if __reads_attributes__(operation):
+            for classes in inputs:
+                plan["attribute_classes"] = __union_classes__(plan["attribute_classes"], classes)
+            if op == 'relate':
+                plan["attribute_classes"] = __union_classes__(plan["attribute_classes"], outputs)
+
+        step_classes.append(outputs)
+        plan["object_classes"] = __union_classes__(plan["object_classes"], outputs)
+
+    return plan
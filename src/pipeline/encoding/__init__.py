@@ -1,3 +1,3 @@
-from pipeline.encoding.scene_encoding import encode_scene
+from pipeline.encoding.scene_encoding import encode_scene, encode_scenes, reencode_scenes
 from pipeline.encoding.question_encoding import encode_question
 from pipeline.utils import sanitize, sanitize_asp, cleanup_whitespace
\ No newline at end of file
@@ -0,0 +1,68 @@
+from clingo.symbol import Function, Number, parse_term
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def __term__(value):
+    return parse_term(value)
+
+def to_symbol(name, arguments):
+    return Function(name, [Number(a) if isinstance(a, int) else __term__(a) for a in arguments])
+
+def format_atom(name, arguments):
+    return f"{name}({', '.join(str(a) for a in arguments)})"
+
+
+class AspProgram:
+    # an encoding as a flat list of ground statements, which can either be rendered as ASP text (for debugging and
+    # the .lp files) or added directly through the clingo backend, so that the solver does not have to parse it again
+    def __init__(self):
+        self.statements = []
+
+    def fact(self, name, *arguments):
+        self.statements.append(("fact", name, arguments, None))
+
+    def choice(self, name, *arguments):
+        self.statements.append(("choice", name, arguments, None))
+
+    def weak(self, weight, name, *arguments, negated=False):
+        self.statements.append(("weak_not" if negated else "weak", name, arguments, weight))
+
+    def extend(self, program):
+        self.statements.extend(program.statements)
+
+    def to_text(self):
+        lines = []
+        for kind, name, arguments, weight in self.statements:
+            atom = format_atom(name, arguments)
+            if kind == "fact":
+                lines.append(f"{atom}.")
+            elif kind == "choice":
+                lines.append(f"{{{atom}}}.")
+            elif kind == "weak":
+                lines.append(f":~ {atom}. [{weight}, ({', '.join(str(a) for a in arguments)})]")
+            else:
+                lines.append(f":~ not {atom}. [{weight}, ({', '.join(str(a) for a in arguments)})]")
+        return "\n".join(lines)
+
+    def add_to(self, ctl):
+        # has to happen before grounding, atoms added through the backend are visible to the grounder
+        with ctl.backend() as backend:
+            atoms = {}
+            for kind, name, arguments, weight in self.statements:
+                key = (name, arguments)
+                if key not in atoms:
+                    atoms[key] = backend.add_atom(to_symbol(name, arguments))
+                atom = atoms[key]
+
+                if kind == "fact":
+                    backend.add_rule([atom])
+                elif kind == "choice":
+                    backend.add_rule([atom], choice=True)
+                elif kind == "weak":
+                    backend.add_minimize(0, [(atom, weight)])
+                else:
+                    backend.add_minimize(0, [(-atom, weight)])
+
+    def __str__(self):
+        return self.to_text()
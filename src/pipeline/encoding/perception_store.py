@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import torch
+from object_detection.detections import Detections, LabelVocabulary
+from pipeline.utils import cleanup_whitespace
+
+# scene entries that are lists of names and arrays of numbers, the probabilities are only present if they were scored
+NAME_KEYS = ["attributes", "standalone_values", "relations"]
+ARRAY_KEYS = ["attr_objects", "attr_probs", "standalone_probs", "rel_pairs", "rel_probs"]
+
+
+def get_perception_key(model, object_detector, lazy):
+    # the stored results depend on the VLM, the detector (model, backend and precision) and whether the perception was
+    # lazy, results of runs that differ in any of them must not be re-encoded together
+    return f"{model.version}+{model.inference_mode.precision}+{object_detector.cache_key}+{'lazy' if lazy else 'eager'}"
+
+
+class PerceptionStore:
+    # the raw perception results of every question (detections, attribute and relation probabilities) as one npz file
+    # per question id, under a directory per perception key, so that encodings can be rebuilt without the models
+    def __init__(self, store_dir, perception_key=None):
+        if perception_key is None:
+            # re-encoding without the models picks the only perception key in the store
+            keys = os.listdir(store_dir) if os.path.isdir(store_dir) else []
+            if len(keys) != 1:
+                raise RuntimeError(f"The perception store {store_dir} has {len(keys)} perception keys, the key has to be given!")
+            perception_key = keys[0]
+
+        self.perception_key = perception_key
+        self.path = f"{store_dir}/{cleanup_whitespace(perception_key)}"
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        self.vocabulary = LabelVocabulary()
+
+    def __store_file__(self, qid):
+        return f"{self.path}/{qid}.npz"
+
+    def __contains__(self, qid):
+        return os.path.isfile(self.__store_file__(qid))
+
+    def save(self, qid, scene):
+        objects = scene["objects"]
+        arrays = {
+            "boxes": objects.boxes.numpy(),
+            "scores": objects.scores.numpy(),
+            "names": np.array(objects.names, dtype=str),
+            "perception_key": np.array(self.perception_key, dtype=str),
+            "image_id": np.array(scene["image_id"], dtype=str),
+            "image_size": np.array([scene["image_size"]["w"], scene["image_size"]["h"]]),
+            "num_attr_values": np.array(scene["num_attr_values"]),
+            **{key: np.array(scene[key], dtype=str) for key in NAME_KEYS},
+            **{key: np.asarray(scene[key]) for key in ARRAY_KEYS if key in scene}
+        }
+
+        with open(f"{self.__store_file__(qid)}.tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(f"{self.__store_file__(qid)}.tmp", self.__store_file__(qid))
+
+    def load(self, qid):
+        if qid not in self:
+            raise RuntimeError(f"Question {qid} is not in the perception store {self.path}!")
+
+        with np.load(self.__store_file__(qid), allow_pickle=False) as arrays:
+            # the directory is only named after the key, the entry itself has to come from the same perception
+            perception_key = str(arrays["perception_key"]) if "perception_key" in arrays else None
+            if perception_key is None or cleanup_whitespace(perception_key) != cleanup_whitespace(self.perception_key):
+                raise RuntimeError(f"Question {qid} in the perception store {self.path} was stored with the perception key {perception_key}, not {self.perception_key}!")
+
+            names = arrays["names"].tolist()
+            scene = {
+                "image_id": str(arrays["image_id"]),
+                "image_size": {"w": int(arrays["image_size"][0]), "h": int(arrays["image_size"][1])},
+                "num_attr_values": int(arrays["num_attr_values"]),
+                "objects": Detections(
+                    torch.from_numpy(arrays["boxes"]), torch.from_numpy(arrays["scores"]),
+                    torch.tensor(self.vocabulary.get_ids(names), dtype=torch.long), self.vocabulary
+                ),
+                **{key: arrays[key].tolist() for key in NAME_KEYS},
+                **{key: arrays[key] for key in ARRAY_KEYS if key in arrays}
+            }
+        return scene
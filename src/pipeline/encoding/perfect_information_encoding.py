@@ -2,32 +2,49 @@ import json
 from pipeline.encoding.question_encoding import encode_question
 from pipeline.utils import sanitize_asp
 
-with open('../data/metadata/gqa_all_class.json') as f:
-    categories = json.load(f)
-class_to_category = {}
-for category, classes in categories.items():
-    for c in classes:
-        if c not in class_to_category:
-            class_to_category[c] = [category]
-        else:
-            class_to_category[c].append(category)
-
-with open('../data/metadata/gqa_all_attribute.json') as f:
-    attributes = json.load(f)
-value_to_attribute = {}
-for attribute, values in attributes.items():
-    for v in values:
-        if v not in value_to_attribute:
-            value_to_attribute[v] = [attribute]
-        else:
-            value_to_attribute[v].append(attribute)
+def get_metadata_lookups(categories, attributes):
+    # class -> the categories it belongs to and attribute value -> the attributes it is a value of
+    class_to_category = {}
+    for category, classes in categories.items():
+        for c in classes:
+            if c not in class_to_category:
+                class_to_category[c] = [category]
+            else:
+                class_to_category[c].append(category)
+
+    value_to_attribute = {}
+    for attribute, values in attributes.items():
+        for v in values:
+            if v not in value_to_attribute:
+                value_to_attribute[v] = [attribute]
+            else:
+                value_to_attribute[v].append(attribute)
+
+    return class_to_category, value_to_attribute
+
+
+# the lookups of the GQA metadata are only loaded on first use, so that the module can be imported without the data
+__gqa_lookups__ = None
+
+def __get_gqa_lookups__():
+    global __gqa_lookups__
+    if __gqa_lookups__ is None:
+        with open('../data/metadata/gqa_all_class.json') as f:
+            categories = json.load(f)
+        with open('../data/metadata/gqa_all_attribute.json') as f:
+            attributes = json.load(f)
+        __gqa_lookups__ = get_metadata_lookups(categories, attributes)
+    return __gqa_lookups__
 
 
 def encode_sample(question):
     return (encode_scene(question['sceneGraph']), encode_question(question))
 
 
-def encode_scene(scene_graph):
+def encode_scene(scene_graph, lookups=None):
+    # lookups as returned by get_metadata_lookups, by default those of the GQA metadata
+    class_to_category, value_to_attribute = lookups if lookups is not None else __get_gqa_lookups__()
+
     scene_encoding = ""
     for oid, object in scene_graph['objects'].items():
         scene_encoding += f"object({oid}).\n"
@@ -1,12 +1,13 @@
+from pipeline.encoding.asp_program import AspProgram
 from pipeline.utils import sanitize_asp
 
-def encode_question(question):
-    question_encoding = ""
+def encode_question(question, as_program=False):
+    program = AspProgram()
     step_padding = 0
     ops_map = {}
     for i, operation in enumerate(question['semantic']):
         if len(operation['dependencies']) == 0:
-            question_encoding += f"scene({i+step_padding}).\n"
+            program.fact("scene", i+step_padding)
             dependencies = [i + step_padding]
             step_padding = step_padding + 1
         else:
@@ -14,55 +15,55 @@ def encode_question(question):
         
         if operation['operation'] == 'select':
             target_class = sanitize_asp(operation['argument'].split('(')[0])
-            question_encoding += f"select({i+step_padding}, {dependencies[0]}, {target_class}).\n"
+            program.fact("select", i+step_padding, dependencies[0], target_class)
 
         elif operation['operation'] == 'relate':
             target_class = sanitize_asp(operation['argument'].split(',')[0])
             relation_type = sanitize_asp(operation['argument'].split(',')[1])
             if relation_type.startswith('same_'):
-                question_encoding += f"relate_attr({i+step_padding}, {dependencies[0]}, {target_class}, {relation_type[5:]}).\n"
+                program.fact("relate_attr", i+step_padding, dependencies[0], target_class, relation_type[5:])
             else:
                 position = 'subject' if operation['argument'].split(',')[2].startswith('s') else 'object'
                 if target_class == '_':
-                    question_encoding += f"relate_any({i+step_padding}, {dependencies[0]}, {relation_type}, {position}).\n"
+                    program.fact("relate_any", i+step_padding, dependencies[0], relation_type, position)
                 else:
-                    question_encoding += f"relate({i+step_padding}, {dependencies[0]}, {target_class}, {relation_type}, {position}).\n"
+                    program.fact("relate", i+step_padding, dependencies[0], target_class, relation_type, position)
 
         elif operation['operation'] == 'query':
-            question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-            question_encoding += f"query({i+step_padding+1}, {i+step_padding}, {operation['argument']}).\n"
+            program.fact("unique", i+step_padding, dependencies[0])
+            program.fact("query", i+step_padding+1, i+step_padding, operation['argument'])
             step_padding += 1
 
         elif operation['operation'] == 'exist':
-            question_encoding += f"exist({i+step_padding}, {dependencies[0]}).\n"
+            program.fact("exist", i+step_padding, dependencies[0])
 
         elif operation['operation'] == 'and':
-            question_encoding += f"and({i+step_padding}, {dependencies[0]}, {dependencies[1]}).\n"
+            program.fact("and", i+step_padding, dependencies[0], dependencies[1])
 
         elif operation['operation'] == 'or':
-            question_encoding += f"or({i+step_padding}, {dependencies[0]}, {dependencies[1]}).\n"
+            program.fact("or", i+step_padding, dependencies[0], dependencies[1])
 
         elif operation['operation'] == 'common':
-            question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-            question_encoding += f"unique({i+step_padding+1}, {dependencies[1]}).\n"
-            question_encoding += f"common({i+step_padding+2}, {i+step_padding}, {i+step_padding+1}).\n"
+            program.fact("unique", i+step_padding, dependencies[0])
+            program.fact("unique", i+step_padding+1, dependencies[1])
+            program.fact("common", i+step_padding+2, i+step_padding, i+step_padding+1)
             step_padding += 2
 
         elif operation['operation'] == 'filter':
             if operation['argument'].startswith('not('):
                 value = sanitize_asp(operation['argument'][4:-1])
-                question_encoding += f"filter_any({i+step_padding}, {dependencies[0]}, {value}).\n"
-                question_encoding += f"negate({i+step_padding+1}, {i+step_padding}, {dependencies[0]}).\n"
+                program.fact("filter_any", i+step_padding, dependencies[0], value)
+                program.fact("negate", i+step_padding+1, i+step_padding, dependencies[0])
                 step_padding = step_padding + 1
             else:
                 value = sanitize_asp(operation['argument'])
-                question_encoding += f"filter_any({i+step_padding}, {dependencies[0]}, {value}).\n"
+                program.fact("filter_any", i+step_padding, dependencies[0], value)
 
         elif operation['operation'] == 'choose':
             option0 = sanitize_asp(operation['argument'].split('|')[0])
             option1 = sanitize_asp(operation['argument'].split('|')[1])
-            question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-            question_encoding += f"choose_attr({i+step_padding+1}, {i+step_padding}, any, {option0}, {option1}).\n"
+            program.fact("unique", i+step_padding, dependencies[0])
+            program.fact("choose_attr", i+step_padding+1, i+step_padding, "any", option0, option1)
             step_padding += 1
 
         elif operation['operation'] == 'choose rel':
@@ -70,8 +71,8 @@ def encode_question(question):
             option0 = sanitize_asp(operation['argument'].split(',')[1].split('|')[0])
             option1 = sanitize_asp(operation['argument'].split(',')[1].split('|')[1])
             position = 'subject' if operation['argument'].split(',')[2].startswith('s') else 'object'
-            question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-            question_encoding += f"choose_rel({i+step_padding+1}, {i+step_padding}, {target_class}, {option0}, {option1}, {position}).\n"
+            program.fact("unique", i+step_padding, dependencies[0])
+            program.fact("choose_rel", i+step_padding+1, i+step_padding, target_class, option0, option1, position)
             step_padding += 1
 
         elif operation['operation'] == 'same':
@@ -79,58 +80,58 @@ def encode_question(question):
                 attr = 'class'
             else:
                 attr = sanitize_asp(operation['argument'])
-            question_encoding += f"all_same({i+step_padding}, {dependencies[0]}, {attr}).\n"
+            program.fact("all_same", i+step_padding, dependencies[0], attr)
 
         elif operation['operation'] == 'different':
             if operation['argument'] == 'type':
                 attr = 'class'
             else:
                 attr = sanitize_asp(operation['argument'])
-            question_encoding += f"all_different({i+step_padding}, {dependencies[0]}, {attr}).\n"
+            program.fact("all_different", i+step_padding, dependencies[0], attr)
 
         elif operation['operation'].startswith('filter'):
             attr = sanitize_asp(' '.join(operation['operation'].split(' ')[1:]))
             if operation['argument'].startswith('not('):
                 value = sanitize_asp(operation['argument'][4:-1])
-                question_encoding += f"filter({i+step_padding}, {dependencies[0]}, {attr}, {value}).\n"
-                question_encoding += f"negate({i+step_padding+1}, {i+step_padding}, {dependencies[0]}).\n"
+                program.fact("filter", i+step_padding, dependencies[0], attr, value)
+                program.fact("negate", i+step_padding+1, i+step_padding, dependencies[0])
                 step_padding = step_padding + 1
             else:
                 value = sanitize_asp(operation['argument'])
-                question_encoding += f"filter({i+step_padding}, {dependencies[0]}, {attr}, {value}).\n"
+                program.fact("filter", i+step_padding, dependencies[0], attr, value)
 
         elif operation['operation'] == 'verify':
             value = sanitize_asp(operation['argument'])
-            question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-            question_encoding += f"verify_attr({i+step_padding+1}, {i+step_padding}, any, {value}).\n"
+            program.fact("unique", i+step_padding, dependencies[0])
+            program.fact("verify_attr", i+step_padding+1, i+step_padding, "any", value)
             step_padding += 1
         
         elif operation['operation'] == 'verify rel':
             target_class = sanitize_asp(operation['argument'].split(',')[0])
             relation_type = sanitize_asp(operation['argument'].split(',')[1])
             position = 'subject' if operation['argument'].split(',')[2].startswith('s') else 'object'
-            question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-            question_encoding += f"verify_rel({i+step_padding+1}, {i+step_padding}, {target_class}, {relation_type}, {position}).\n"
+            program.fact("unique", i+step_padding, dependencies[0])
+            program.fact("verify_rel", i+step_padding+1, i+step_padding, target_class, relation_type, position)
             step_padding += 1
         
         elif operation['operation'].startswith('verify'):
             attr = sanitize_asp(' '.join(operation['operation'].split(' ')[1:]))
             value = sanitize_asp(operation['argument'])
-            question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-            question_encoding += f"verify_attr({i+step_padding+1}, {i+step_padding}, {attr}, {value}).\n"
+            program.fact("unique", i+step_padding, dependencies[0])
+            program.fact("verify_attr", i+step_padding+1, i+step_padding, attr, value)
             step_padding += 1
 
         elif operation['operation'].startswith('choose'):
             if operation['argument'] == '':
                 op_tokens = operation['operation'].split(' ')
-                question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-                question_encoding += f"unique({i+step_padding+1}, {dependencies[1]}).\n"
+                program.fact("unique", i+step_padding, dependencies[0])
+                program.fact("unique", i+step_padding+1, dependencies[1])
 
                 if len(op_tokens) >= 3:
                     if sanitize_asp(op_tokens[1]) == 'more':
-                        question_encoding += f"compare({i+step_padding+2}, {i+step_padding}, {i+step_padding+1}, {sanitize_asp(op_tokens[2])}, true).\n"
+                        program.fact("compare", i+step_padding+2, i+step_padding, i+step_padding+1, sanitize_asp(op_tokens[2]), "true")
                     elif sanitize_asp(op_tokens[1]) == 'less':
-                        question_encoding += f"compare({i+step_padding+2}, {i+step_padding}, {i+step_padding+1}, {sanitize_asp(op_tokens[2])}, false).\n"
+                        program.fact("compare", i+step_padding+2, i+step_padding, i+step_padding+1, sanitize_asp(op_tokens[2]), "false")
                 else:
                     token = sanitize_asp(op_tokens[1])
                     if token.endswith('er'):
@@ -138,32 +139,32 @@ def encode_question(question):
                         if token.endswith('i'):
                             token = token[:-1] + 'y'
 
-                    question_encoding += f"compare({i+step_padding+2}, {i+step_padding}, {i+step_padding+1}, {token}, true).\n"
-                    question_encoding += f"query({i+step_padding+3}, {i+step_padding+2}, name).\n"
+                    program.fact("compare", i+step_padding+2, i+step_padding, i+step_padding+1, token, "true")
+                    program.fact("query", i+step_padding+3, i+step_padding+2, "name")
                 step_padding += 3
             else:
                 attr = sanitize_asp(' '.join(operation['operation'].split(' ')[1:]))
                 option0 = sanitize_asp(operation['argument'].split('|')[0])
                 option1 = sanitize_asp(operation['argument'].split('|')[1])
-                question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-                question_encoding += f"choose_attr({i+step_padding+1}, {i+step_padding}, {attr}, {option0}, {option1}).\n"
+                program.fact("unique", i+step_padding, dependencies[0])
+                program.fact("choose_attr", i+step_padding+1, i+step_padding, attr, option0, option1)
                 step_padding += 1
 
         elif operation['operation'].startswith('same'):
             attr = sanitize_asp(' '.join(operation['operation'].split(' ')[1:]))
-            question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-            question_encoding += f"unique({i+step_padding+1}, {dependencies[1]}).\n"
-            question_encoding += f"two_same({i+step_padding+2}, {i+step_padding}, {i+step_padding+1}, {attr}).\n"
+            program.fact("unique", i+step_padding, dependencies[0])
+            program.fact("unique", i+step_padding+1, dependencies[1])
+            program.fact("two_same", i+step_padding+2, i+step_padding, i+step_padding+1, attr)
             step_padding += 2
 
         elif operation['operation'].startswith('different'):
             attr = sanitize_asp(' '.join(operation['operation'].split(' ')[1:]))
-            question_encoding += f"unique({i+step_padding}, {dependencies[0]}).\n"
-            question_encoding += f"unique({i+step_padding+1}, {dependencies[1]}).\n"
-            question_encoding += f"two_different({i+step_padding+2}, {i+step_padding}, {i+step_padding+1}, {attr}).\n"
+            program.fact("unique", i+step_padding, dependencies[0])
+            program.fact("unique", i+step_padding+1, dependencies[1])
+            program.fact("two_different", i+step_padding+2, i+step_padding, i+step_padding+1, attr)
             step_padding += 2 
         
         ops_map[i] = i + step_padding
 
-    question_encoding += f"end({len(question['semantic'])+step_padding-1})."
-    return question_encoding
\ No newline at end of file
+    program.fact("end", len(question['semantic'])+step_padding-1)
+    return program if as_program else program.to_text()
\ No newline at end of file
@@ -1,256 +1,398 @@
 from torchvision.io import read_image, ImageReadMode
-from torchvision.transforms.functional import crop, resize, pad
-from pipeline.concept_extraction import extract_classes, extract_attributes, extract_relations
+from pipeline.concept_extraction import extract_classes, extract_attributes, extract_relations, extract_perception_plan
 from pipeline.bounding_box_optimization import get_object_bboxes, get_pair_bboxes
+from pipeline.image_cropping import crop_images
+from pipeline.encoding.asp_program import AspProgram
+from object_detection.box_merging import CategoryIndex, remove_duplicate_objects
+from object_detection.detections import Detections
 from pipeline.utils import cleanup_whitespace, sanitize_asp
+from pipeline.instrumentation import StageTimer, recording, stage, count
+import numpy as np
 import math
 import torch
 
 
-def bboxes_to_image_crops(bboxes, image, model, mode="pad"):
-    bbox_crops = []
-    for bbox in bboxes:
-        y, x, h, w = int(bbox[0]), int(bbox[1]), int(bbox[2]-bbox[0]), int(bbox[3]-bbox[1])
-        bbox_crop = crop(image, y, x, h, w)
-
-        if mode == "pad":
-            # resize and scale (maintain aspect ratio)
-            if h > w:
-                resize_dimensions = (
-                    model.img_size, 2*round((model.img_size*w/h)/2))
-            else:
-                resize_dimensions = (
-                    2*round((model.img_size*h/w)/2), model.img_size)
-            bbox_crop = resize(bbox_crop, resize_dimensions, antialias=True)
-
-            # pad the image to square dimensions
-            bbox_crop = pad(bbox_crop, ((
-                model.img_size - resize_dimensions[1])//2, (model.img_size - resize_dimensions[0])//2))
-
-        elif mode == "scale":
-            # resize and scale the image to the target dimensions
-            bbox_crop = resize(
-                bbox_crop, (model.img_size, model.img_size), antialias=True)
-        else:
-            raise RuntimeError("Unsupported image processing mode!")
+def prob_to_asp_weight(prob):
+    return int(min(-1000*math.log(prob), 5000))
 
-        bbox_crops.append(bbox_crop)
+@stage("duplicate_removal")
+def merge_detected_objects(objects_a, objects_b, all_classes, category_index=None):
+    category_index = category_index if category_index is not None else CategoryIndex(all_classes)
+    return Detections.cat([objects_a, remove_duplicate_objects(objects_a, objects_b, category_index, overlap_threshold=0.7)])
 
-    return bbox_crops
 
+def get_article(name):
+    return "an" if any(name.startswith(v) for v in ["a", "e", "i", "o", "u"]) else "a"
 
-def prob_to_asp_weight(prob):
-    return int(min(-1000*math.log(prob), 5000))
 
-def __should_merge__(box1, box2, overlap_threshold):
-        YA1, XA1, YA2, XA2 = box1 
-        YB1, XB1, YB2, XB2 = box2
-        box1_area = (YA2 - YA1) * (XA2 - XA1)
-        box2_area = (YB2 - YB1) * (XB2 - XB1)
-        intersection_area = max(0, min(XA2, XB2) - max(XA1, XB1)) * max(0, min(YA2, YB2) - max(YA1, YB1))
-        union_area = box1_area + box2_area - intersection_area
-
-        if intersection_area / union_area > overlap_threshold:
-            return True, (
-                min(box1[0], box2[0]),
-                min(box1[1], box2[1]),
-                max(box1[2], box2[2]),
-                max(box1[3], box2[3]),
-            )
+def get_object_prompt(name):
+    return f"a pixelated picture of {get_article(name)} {name}"
 
-        return False, None
-
-def merge_detected_objects(objects_a, objects_b, all_classes):
-    objects = [*objects_a]
-    for ob in objects_b:
-        alread_present = False
-        for oa in objects_a:
-            categories_a = {cat for cat in all_classes if oa["name"] in all_classes[cat]}
-            categories_b = {cat for cat in all_classes if ob["name"] in all_classes[cat]}
-            if len(categories_a & categories_b) > 0:
-                is_merge, _ = __should_merge__(
-                        (oa['y'], oa['x'], oa['y']+oa['h'], oa['x']+oa['w']), 
-                        (ob['y'], ob['x'], ob['y']+ob['h'], ob['x']+ob['w']), 
-                        overlap_threshold=0.7
-                    )
-                if is_merge:
-                    alread_present = True
-        if not alread_present:
-            objects.append(ob)
 
-    return objects
+def get_attribute_prompt(value, name):
+    return f"a pixelated picture of {get_article(value)} {value} {name}"
 
 
-def get_article(name):
-    return "an" if any(name.startswith(v) for v in ["a", "e", "i", "o", "u"]) else "a"
+def get_relation_prompt(name1, relation, name2):
+    return f"{get_article(name1)} {name1} {relation} {get_article(name2)} {name2}"
 
 
-def detect_objects_question_driven(image, classes, object_detector, all_classes, all_child_classes):
-    objects = []
+@stage("detection")
+def detect_objects_question_driven(image, classes, object_detector, all_classes, all_child_classes, image_id=None):
+    category_index = CategoryIndex(all_classes)
+    objects = Detections.empty(object_detector.vocabulary)
     for clazz in classes["classes"]:
-        detected_objects = object_detector.detect_objects(image, [clazz.replace("_", " ")], threshold=0.03, k=5)
-        objects.extend(detected_objects)
+        detected_objects = object_detector.detect_objects(image, [clazz.replace("_", " ")], threshold=0.03, k=5, image_id=image_id)
+        objects = Detections.cat([objects, detected_objects])
 
     for category in classes["categories"]:
-        detected_objects = object_detector.detect_objects(image, [c.replace("_", " ") for c in all_classes[category]], threshold=0.03, k=5)
-        objects = merge_detected_objects(objects, detected_objects, all_classes)
+        detected_objects = object_detector.detect_objects(image, [c.replace("_", " ") for c in all_classes[category]], threshold=0.03, k=5, image_id=image_id)
+        objects = merge_detected_objects(objects, detected_objects, all_classes, category_index)
 
     if classes["all"]:
-        detected_objects = object_detector.detect_objects(image, all_child_classes, threshold=0.03, k=25)
-        objects = merge_detected_objects(objects, detected_objects, all_classes)
+        detected_objects = object_detector.detect_objects(image, all_child_classes, threshold=0.03, k=25, image_id=image_id)
+        objects = merge_detected_objects(objects, detected_objects, all_classes, category_index)
     return objects
 
-@torch.no_grad()
-def encode_scene(question, model, object_detector, all_classes, all_child_classes, all_attributes, image_path):
-    scene_encoding = ""
-    
-    attributes, standalone_values = extract_attributes(question, all_attributes)
-    num_attr_values = sum(len(all_attributes.get(attr, [])) for attr in attributes)
-    num_standalone_values = len(standalone_values)
-    classes = extract_classes(question, all_classes)
-    relations = extract_relations(question)
-    num_relations = len(relations)
+def get_object_classes(objects, all_classes):
+    # the class constants every object has in the encoding: its own class and all categories it belongs to
+    object_classes = []
+    for name in objects.names:
+        classes = {sanitize_asp(name)}
+        classes.update(sanitize_asp(category) for category in all_classes if sanitize_asp(name) in all_classes[category])
+        object_classes.append(classes)
+    return object_classes
 
-    for attr in attributes:
-        scene_encoding += f"is_attr({cleanup_whitespace(attr)}).\n"
-        for val in all_attributes.get(attr, []):
-            scene_encoding += f"is_attr_value({cleanup_whitespace(attr)}, {cleanup_whitespace(val)}).\n"
-        scene_encoding += "\n"
 
-    scene_encoding += "\n"
+def __matches_classes__(classes, object_classes):
+    return np.array([classes is None or not classes.isdisjoint(c) for c in object_classes], dtype=bool)
+
 
-    image = read_image(f"{image_path}/{question['imageId']}.jpg", ImageReadMode.RGB)
+def prepare_scene(question, object_detector, all_classes, all_child_classes, all_attributes, image_path, image_loader=None, lazy=False):
+    with stage("concept_extraction"):
+        attributes, standalone_values = extract_attributes(question, all_attributes)
+        attributes, standalone_values = list(attributes), list(standalone_values)
+        classes = extract_classes(question, all_classes)
+        relations = list(extract_relations(question))
+
+    # with an image loader, this is only the time spent waiting for the image
+    with stage("image_decode"):
+        if image_loader is not None:
+            image = image_loader.get(question['imageId'])
+        else:
+            image = read_image(f"{image_path}/{question['imageId']}.jpg", ImageReadMode.RGB)
     image_size = {'w': image.shape[2], 'h': image.shape[1]}
 
-    objects = detect_objects_question_driven(image, classes, object_detector, all_classes, all_child_classes)
-    object_items = [(f"o{i}", o) for i, o in enumerate(objects)]
+    objects = detect_objects_question_driven(image, classes, object_detector, all_classes, all_child_classes, image_id=question["imageId"])
     num_objects = len(objects)
+    count("detected_objects", num_objects)
 
-    if (len(attributes) > 0 or len(standalone_values) > 0) and len(objects) > 0:
-        object_bboxes = get_object_bboxes(objects, image_size)
-        obj_bbox_crops = bboxes_to_image_crops(object_bboxes, image, model)
-       
-        neutral_prompts = [f"a pixelated picture of {get_article(obj['name'])} {obj['name']}" for obj in objects]
-        attr_prompts = [f"a pixelated picture of {get_article(val)} {val} {obj['name']}"
-                        for obj in objects
-                        for attr in attributes
-                        for val in all_attributes.get(attr, [])]
-        standalone_value_prompts = [f"a pixelated picture of {get_article(val)} {val} {obj['name']}"
-                                    for obj in objects
-                                    for val in standalone_values]
-        
-        obj_logits_per_image = model.score(obj_bbox_crops, [*neutral_prompts, *attr_prompts, *standalone_value_prompts])
-            
-    if len(relations) > 0 and len(objects) > 1:
+    # objects whose attributes and ordered object pairs whose relations are scored, all of them unless lazy
+    attr_objects = np.ones(num_objects, dtype=bool)
+    rel_pairs = ~np.eye(num_objects, dtype=bool)
+    if len(relations) > 0 and num_objects > 1:
+        # pair boxes are merged over all detections, so that lazy scoring sees the same pair crops as eager scoring
         rel_bboxes, rel_bbox_indices = get_pair_bboxes(objects, merge_threshold=0.6)
-        rel_bbox_crops = bboxes_to_image_crops(rel_bboxes, image, model)
-    
-    # add attributes derived from object detection (names, vposition/hposition)
-    for o1, (oid1, object1) in enumerate(object_items):
-        scene_encoding += f"object({oid1}).\n"
-        scene_encoding += f"has_obj_weight({oid1}, {prob_to_asp_weight(object1['score'])}).\n"
 
-        scene_encoding += f"has_attr({oid1}, class, {sanitize_asp(object1['name'])}).\n"
-        for category in all_classes: 
-            if sanitize_asp(object1["name"]) in all_classes[category]:
-                scene_encoding += f"has_attr({oid1}, class, {sanitize_asp(category)}).\n"
-        
-        scene_encoding += f"has_attr({oid1}, name, {sanitize_asp(object1['name'])}).\n"
+    if lazy:
+        # the question program can only ever look at objects of the classes it selects/relates, only read the attributes
+        # of objects in some of its steps and only the relations between the classes of a relate step; everything else
+        # is left out of the encoding instead of being scored
+        with stage("perception_planning"):
+            plan = extract_perception_plan(question)
+            object_classes = get_object_classes(objects, all_classes)
+
+            kept_objects = __matches_classes__(plan["object_classes"], object_classes)
+            attr_objects = __matches_classes__(plan["attribute_classes"], object_classes)
+            rel_pairs = np.zeros((num_objects, num_objects), dtype=bool)
+            for subject_classes, object_classes_ in plan["relation_pairs"]:
+                rel_pairs |= __matches_classes__(subject_classes, object_classes)[:, None] & __matches_classes__(object_classes_, object_classes)[None, :]
+            rel_pairs &= ~np.eye(num_objects, dtype=bool)
+
+        objects = objects[torch.from_numpy(kept_objects)]
+        attr_objects = attr_objects[kept_objects]
+        rel_pairs = rel_pairs[kept_objects][:, kept_objects]
+        if len(relations) > 0 and num_objects > 1:
+            rel_bbox_indices = rel_bbox_indices[kept_objects][:, kept_objects]
+
+    scene = {
+        "image_id": question["imageId"],
+        "attributes": attributes,
+        "standalone_values": standalone_values,
+        "num_attr_values": sum(len(all_attributes.get(attr, [])) for attr in attributes),
+        "relations": relations,
+        "image_size": image_size,
+        "objects": objects,
+        "image": image
+    }
+
+    if (len(attributes) > 0 or len(standalone_values) > 0) and attr_objects.any():
+        scene["attr_objects"] = np.flatnonzero(attr_objects)
+        scene["obj_bboxes"] = get_object_bboxes(objects[torch.from_numpy(scene["attr_objects"])], image_size)
+
+        # one block of prompts per object: its neutral prompt, then its attribute value and standalone value prompts
+        scene["obj_prompts"] = []
+        names = objects.names
+        for o in scene["attr_objects"]:
+            scene["obj_prompts"].append(get_object_prompt(names[o]))
+            scene["obj_prompts"].extend(get_attribute_prompt(val, names[o]) for attr in attributes for val in all_attributes.get(attr, []))
+            scene["obj_prompts"].extend(get_attribute_prompt(val, names[o]) for val in standalone_values)
+
+    if len(relations) > 0 and rel_pairs.any():
+        # ordered pairs in row-major order, every pair is scored on the crop of its (merged) pair box
+        scene["rel_pairs"] = np.argwhere(rel_pairs)
+        pair_bbox_indices = rel_bbox_indices[rel_pairs]
+        used_bboxes, scene["rel_bbox_indices"] = np.unique(pair_bbox_indices, return_inverse=True)
+        scene["rel_bboxes"] = [rel_bboxes[i] for i in used_bboxes]
+
+        # one block of relation prompts (plus a neutral "and" prompt) per ordered object pair
+        scene["rel_prompts"] = []
+        names = objects.names
+        for o1, o2 in scene["rel_pairs"]:
+            for rel in relations:
+                scene["rel_prompts"].append(get_relation_prompt(names[o1], rel, names[o2]))
+            scene["rel_prompts"].append(get_relation_prompt(names[o1], "and", names[o2]))
+
+    count("objects", len(objects))
+    count("attr_objects", len(scene.get("attr_objects", [])))
+    count("obj_prompts", len(scene.get("obj_prompts", [])))
+    count("rel_pairs", len(scene.get("rel_pairs", [])))
+    count("rel_prompts", len(scene.get("rel_prompts", [])))
+    count("crops", len(scene.get("attr_objects", [])) + len(scene.get("rel_bboxes", [])))
+    return scene
+
+
+def get_value_probs(value_logits, neutral_logits):
+    # contrast every value prompt of an object (pair) against its neutral prompt
+    value_scores = torch.stack([value_logits, neutral_logits.expand(value_logits.shape)])
+    return torch.nn.functional.softmax(value_scores, dim=0).tolist()
+
+
+def get_text_features(texts, model, text_bank=None):
+    # identical prompts (e.g. neutral prompts of objects with the same name) are only encoded once
+    unique_texts = list(dict.fromkeys(texts))
+    if text_bank is not None:
+        text_features = text_bank.get_text_features(unique_texts)
+    else:
+        text_features = model.get_text_features(unique_texts)
+
+    text_indices = {text: i for i, text in enumerate(unique_texts)}
+    return text_features[[text_indices[text] for text in texts]]
+
+
+@stage("crop_extraction")
+def crop_scenes(scenes, model, mode="pad"):
+    # crops are deduplicated per image, so that questions about the same image share their object and pair crops, and
+    # all crops of an image are extracted in one roi_align over it on the device
+    images, image_bboxes, scene_bboxes = {}, {}, []
+    for scene in scenes:
+        images[scene["image_id"]] = scene["image"]
+        bboxes = image_bboxes.setdefault(scene["image_id"], {})
+        obj_indices = [bboxes.setdefault(tuple(bbox), len(bboxes)) for bbox in (scene["obj_bboxes"] if "obj_prompts" in scene else [])]
+        rel_indices = [bboxes.setdefault(tuple(bbox), len(bboxes)) for bbox in (scene["rel_bboxes"] if "rel_prompts" in scene else [])]
+        scene_bboxes.append((scene["image_id"], obj_indices, rel_indices))
+
+    crops, image_offsets = [], {}
+    for image_id, bboxes in image_bboxes.items():
+        image_offsets[image_id] = sum(len(c) for c in crops)
+        if len(bboxes) > 0:
+            crops.append(crop_images(images[image_id], list(bboxes), model, mode))
+
+    obj_crop_indices = [torch.tensor(obj_indices, dtype=torch.long) + image_offsets[image_id] for image_id, obj_indices, _ in scene_bboxes]
+    rel_crop_indices = [torch.tensor(rel_indices, dtype=torch.long) + image_offsets[image_id] for image_id, _, rel_indices in scene_bboxes]
+    return (torch.cat(crops) if len(crops) > 0 else None), obj_crop_indices, rel_crop_indices
+
+
+def score_scenes(scenes, model, text_bank=None, crop_mode="pad"):
+    # the image tower runs once over the distinct crops of the batch and the text tower once over its prompts, then every
+    # crop is only scored against its own prompts
+    crops, obj_crop_indices, rel_crop_indices = crop_scenes(scenes, model, crop_mode)
+    if crops is None:
+        return
+
+    with stage("image_tower"):
+        image_features = model.get_image_features(crops)
+    count("unique_crops", len(crops))
+    del crops
+
+    obj_scenes = [(scene, crop_indices) for scene, crop_indices in zip(scenes, obj_crop_indices) if "obj_prompts" in scene]
+    if len(obj_scenes) > 0:
+        with stage("text_tower"):
+            obj_text_features = get_text_features([prompt for scene, _ in obj_scenes for prompt in scene["obj_prompts"]], model, text_bank).to(image_features.dtype)
+
+        prompt_offset = 0
+        for scene, crop_indices in obj_scenes:
+            num_objects = len(scene["attr_objects"])
+            num_prompts = len(scene["obj_prompts"])
+            num_attr_values = scene["num_attr_values"]
+
+            obj_logits = model.score_features_paired(
+                image_features[crop_indices.to(image_features.device)],
+                obj_text_features[prompt_offset:prompt_offset+num_prompts].reshape(num_objects, num_prompts//num_objects, -1)
+            )
 
-        if (object1['x'] + object1['w']/2) > image_size["w"]/3*2:
-            scene_encoding += f"has_attr({oid1}, hposition, right).\n"
-        elif (object1['x'] + object1['w']/2) > image_size["w"]/3:
-            scene_encoding += f"has_attr({oid1}, hposition, middle).\n"
-        else:
-            scene_encoding += f"has_attr({oid1}, hposition, left).\n"
+            if len(scene["attributes"]) > 0:
+                scene["attr_probs"] = get_value_probs(obj_logits[:, 1:1+num_attr_values], obj_logits[:, :1])
+            if len(scene["standalone_values"]) > 0:
+                scene["standalone_probs"] = get_value_probs(obj_logits[:, 1+num_attr_values:], obj_logits[:, :1])
+
+            prompt_offset += num_prompts
+            del obj_logits
+
+        del obj_text_features
+
+    # get cosine similarities between relations and every object pair's image crop
+    rel_scenes = [(scene, crop_indices) for scene, crop_indices in zip(scenes, rel_crop_indices) if "rel_prompts" in scene]
+    if len(rel_scenes) > 0:
+        with stage("text_tower"):
+            rel_text_features = get_text_features([prompt for scene, _ in rel_scenes for prompt in scene["rel_prompts"]], model, text_bank).to(image_features.dtype)
+
+        prompt_offset = 0
+        for scene, crop_indices in rel_scenes:
+            num_relations = len(scene["relations"])
+            num_pairs = len(scene["rel_pairs"])
+            num_prompts = len(scene["rel_prompts"])
+
+            # the (merged) crop of every ordered pair, in the same order as the pairs' prompt blocks
+            pair_crop_indices = crop_indices[scene["rel_bbox_indices"]]
+            rel_logits = model.score_features_paired(
+                image_features[pair_crop_indices.to(image_features.device)],
+                rel_text_features[prompt_offset:prompt_offset+num_prompts].reshape(num_pairs, num_relations+1, -1)
+            )
+            scene["rel_probs"] = get_value_probs(rel_logits[:, :num_relations], rel_logits[:, num_relations:])
 
-        if (object1['y'] + object1['h']/2) > image_size["h"]/3*2:
-            scene_encoding += f"has_attr({oid1}, vposition, bottom).\n"
-        elif (object1['y'] + object1['h']/2) > image_size["h"]/3:
-            scene_encoding += f"has_attr({oid1}, vposition, middle).\n"
-        else:
-            scene_encoding += f"has_attr({oid1}, vposition, top).\n"
-        scene_encoding += "\n"
+            prompt_offset += num_prompts
+            del rel_logits
+
+        del rel_text_features
+
+    del image_features
+
+
+@stage("asp_generation")
+def build_scene_program(scene, all_classes, all_attributes):
+    program = AspProgram()
+
+    attributes = scene["attributes"]
+    standalone_values = scene["standalone_values"]
+    relations = scene["relations"]
+    image_size = scene["image_size"]
+    objects = scene["objects"]
+    object_ids = [f"o{i}" for i in range(len(objects))]
+    hpositions, vpositions = objects.get_positions(image_size)
+    # rows of the scored objects and pairs in the probabilities
+    attr_rows = {o: r for r, o in enumerate(scene["attr_objects"].tolist())} if "attr_objects" in scene else {}
+    pair_rows = {(o1, o2): p for p, (o1, o2) in enumerate(scene["rel_pairs"].tolist())} if "rel_pairs" in scene else {}
+
+    for attr in attributes:
+        program.fact("is_attr", cleanup_whitespace(attr))
+        for val in all_attributes.get(attr, []):
+            program.fact("is_attr_value", cleanup_whitespace(attr), cleanup_whitespace(val))
+
+    # add attributes derived from object detection (names, vposition/hposition)
+    for o1, (oid1, name1, score1) in enumerate(zip(object_ids, objects.names, objects.scores.tolist())):
+        program.fact("object", oid1)
+        program.fact("has_obj_weight", oid1, prob_to_asp_weight(score1))
 
-        neutral_indices = num_objects
-        if len(attributes) > 0:    
-            attr_scores = torch.stack([
-                obj_logits_per_image[o1, neutral_indices+o1*(num_attr_values):neutral_indices+(o1+1)*num_attr_values],
-                obj_logits_per_image[o1, o1].expand(num_attr_values)
-            ])
-            attr_probs = torch.nn.functional.softmax(attr_scores, dim=0)  
+        program.fact("has_attr", oid1, "class", sanitize_asp(name1))
+        for category in all_classes: 
+            if sanitize_asp(name1) in all_classes[category]:
+                program.fact("has_attr", oid1, "class", sanitize_asp(category))
+        
+        program.fact("has_attr", oid1, "name", sanitize_asp(name1))
+        program.fact("has_attr", oid1, "hposition", hpositions[o1])
+        program.fact("has_attr", oid1, "vposition", vpositions[o1])
 
-            # print(f"{num_attr_values}, {attr_probs.shape}")
+        # objects and pairs that were not scored (lazy perception) have no attribute values and relations
+        if "attr_probs" in scene and o1 in attr_rows:
+            attr_probs = scene["attr_probs"]
+            r = attr_rows[o1]
 
             j = 0
             for attr in attributes:
                 for val in all_attributes.get(attr, []): 
-                    scene_encoding += f"{{has_attr({oid1}, {cleanup_whitespace(attr)}, {cleanup_whitespace(val)})}}.\n"
-                    scene_encoding += f":~ has_attr({oid1}, {cleanup_whitespace(attr)}, {cleanup_whitespace(val)}). [{prob_to_asp_weight(attr_probs[0,j])}, ({oid1}, {cleanup_whitespace(attr)}, {cleanup_whitespace(val)})]\n"
-                    scene_encoding += f":~ not has_attr({oid1}, {cleanup_whitespace(attr)}, {cleanup_whitespace(val)}). [{prob_to_asp_weight(attr_probs[1,j])}, ({oid1}, {cleanup_whitespace(attr)}, {cleanup_whitespace(val)})]\n"
+                    atom = (oid1, cleanup_whitespace(attr), cleanup_whitespace(val))
+                    program.choice("has_attr", *atom)
+                    program.weak(prob_to_asp_weight(attr_probs[0][r][j]), "has_attr", *atom)
+                    program.weak(prob_to_asp_weight(attr_probs[1][r][j]), "has_attr", *atom, negated=True)
                     j += 1
-                
-            scene_encoding += "\n"
 
-            del attr_scores, attr_probs
-
-        if len(standalone_values) > 0:
-            attr_indices = num_objects*num_attr_values
-            standalone_scores = torch.stack([
-                obj_logits_per_image[o1, (neutral_indices+attr_indices)+o1*num_standalone_values:(neutral_indices+attr_indices)+(o1+1)*num_standalone_values],
-                obj_logits_per_image[o1, o1].expand(num_standalone_values)
-            ])
-            standalone_probs = torch.nn.functional.softmax(standalone_scores, dim=0)
-
-            # print(f"{num_standalone_values}, {standalone_probs.shape}")
+        if "standalone_probs" in scene and o1 in attr_rows:
+            standalone_probs = scene["standalone_probs"]
+            r = attr_rows[o1]
 
             k = 0
             for standalone_value_ in standalone_values:
-                scene_encoding += f"{{has_attr({oid1}, any, {cleanup_whitespace(standalone_value_)})}}.\n"
-                scene_encoding += f":~ has_attr({oid1}, any, {cleanup_whitespace(standalone_value_)}). [{prob_to_asp_weight(standalone_probs[0,k])}, ({oid1}, any, {cleanup_whitespace(standalone_value_)})]\n"
-                scene_encoding += f":~ not has_attr({oid1}, any, {cleanup_whitespace(standalone_value_)}). [{prob_to_asp_weight(standalone_probs[1,k])}, ({oid1}, any, {cleanup_whitespace(standalone_value_)})]\n"
+                atom = (oid1, "any", cleanup_whitespace(standalone_value_))
+                program.choice("has_attr", *atom)
+                program.weak(prob_to_asp_weight(standalone_probs[0][r][k]), "has_attr", *atom)
+                program.weak(prob_to_asp_weight(standalone_probs[1][r][k]), "has_attr", *atom, negated=True)
                 k += 1
 
-            del standalone_scores, standalone_probs
-
-        # get cosine similarities between relations and every object pair's image crop
-        if len(relations) > 0 and len(objects) > 1:
-            rel_prompts = []
-            for oid2, object2 in object_items:
-                if oid2 != oid1:
-                    for rel in relations:
-                        rel_prompts.append(f"{get_article(object1['name'])} {object1['name']} {rel} {get_article(object2['name'])} {object2['name']}")
-                    rel_prompts.append(f"{get_article(object1['name'])} {object1['name']} and {get_article(object2['name'])} {object2['name']}")
-
-            rel_logits_per_image = model.score(rel_bbox_crops, rel_prompts)
-            
-            m = 0
-            for o2, (oid2, object2) in enumerate(object_items):
-                if oid1 != oid2:
-                    rel_scores = torch.stack([
-                        rel_logits_per_image[rel_bbox_indices[o1, o2], m*(num_relations+1):m*(num_relations+1)+num_relations],
-                        rel_logits_per_image[rel_bbox_indices[o1, o2], m*(num_relations+1)+num_relations].expand(num_relations)
-                    ])
-                    rel_probs = torch.nn.functional.softmax(rel_scores, dim=0)
+        if "rel_probs" in scene:
+            rel_probs = scene["rel_probs"]
+            for o2, oid2 in enumerate(object_ids):
+                if (o1, o2) in pair_rows:
+                    p = pair_rows[(o1, o2)]
 
                     n = 0
                     for rel in relations:
-                        scene_encoding += f"{{has_rel({oid1}, {cleanup_whitespace(rel)}, {oid2})}}.\n"
-                        scene_encoding += f":~ has_rel({oid1}, {cleanup_whitespace(rel)}, {oid2}). [{prob_to_asp_weight(rel_probs[0,n])}, ({oid1}, {cleanup_whitespace(rel)}, {oid2})]\n"
-                        scene_encoding += f":~ not has_rel({oid1}, {cleanup_whitespace(rel)}, {oid2}). [{prob_to_asp_weight(rel_probs[1,n])}, ({oid1}, {cleanup_whitespace(rel)}, {oid2})]\n"
-
+                        atom = (oid1, cleanup_whitespace(rel), oid2)
+                        program.choice("has_rel", *atom)
+                        program.weak(prob_to_asp_weight(rel_probs[0][p][n]), "has_rel", *atom)
+                        program.weak(prob_to_asp_weight(rel_probs[1][p][n]), "has_rel", *atom, negated=True)
                         n += 1
-                    
-                    scene_encoding += "\n"
-                    m += 1
 
-                    del rel_scores, rel_probs
-                
-            del rel_logits_per_image
+    return program
+
 
-    try: 
-        del obj_logits_per_image
-    except:
-        pass
+def build_scene_encoding(scene, all_classes, all_attributes):
+    return build_scene_program(scene, all_classes, all_attributes).to_text()
 
-    return scene_encoding
\ No newline at end of file
+
+@torch.no_grad()
+def encode_scenes(questions, model, object_detector, all_classes, all_child_classes, all_attributes, image_path, text_bank=None, as_program=False, image_loader=None, lazy=False, perception_store=None, timers=None):
+    # perception is done per question, but the VLM sees the crops and prompts of all questions at once
+    # lazy only scores the objects and pairs that the question program can look at
+    # timers (one StageTimer per question) record the stages of every question, the stages that run once for the whole
+    # batch are split evenly between its questions
+    timers = timers if timers is not None else [None]*len(questions)
+
+    scenes = []
+    for question, timer in zip(questions, timers):
+        with recording(timer):
+            scenes.append(prepare_scene(question, object_detector, all_classes, all_child_classes, all_attributes, image_path, image_loader, lazy))
+
+    batch_timer = StageTimer() if any(timer is not None for timer in timers) else None
+    with recording(batch_timer):
+        score_scenes(scenes, model, text_bank)
+    for timer in timers:
+        if timer is not None:
+            timer.add(batch_timer, share=1/len(questions))
+
+    programs = []
+    for question, scene, timer in zip(questions, scenes, timers):
+        with recording(timer):
+            # the raw perception results are kept, so that the encodings can be rebuilt later without the models
+            if perception_store is not None:
+                with stage("perception_store"):
+                    perception_store.save(question["qid"], scene)
+
+            # as_program returns AspPrograms that the solver adds directly instead of ASP text
+            program = build_scene_program(scene, all_classes, all_attributes)
+            if not as_program:
+                with stage("asp_text"):
+                    program = program.to_text()
+            programs.append(program)
+
+    return programs
+
+
+def encode_scene(question, model, object_detector, all_classes, all_child_classes, all_attributes, image_path, text_bank=None, as_program=False, image_loader=None, lazy=False, perception_store=None):
+    return encode_scenes([question], model, object_detector, all_classes, all_child_classes, all_attributes, image_path, text_bank, as_program, image_loader, lazy, perception_store)[0]
+
+
+def reencode_scenes(questions, perception_store, all_classes, all_attributes, as_program=False):
+    # encodings from the stored perception results of the questions, without any model
+    programs = [build_scene_program(perception_store.load(question["qid"]), all_classes, all_attributes) for question in questions]
+    return programs if as_program else [program.to_text() for program in programs]
@@ -1,6 +1,6 @@
-from clingo.control import Control 
 import json 
 from pipeline.encoding.perfect_information_encoding import encode_sample
+from pipeline.solving import SolverSession
 from pipeline.utils import sanitize_asp
 from itertools import islice
 
@@ -9,6 +9,7 @@ with open('../data/questions/train_sampled_questions_10000.json') as f:
 
 with open('./theory.lp') as tf:
     theory = tf.read()
+    session = SolverSession(theory, timeout=None)
 
 num_questions = len(questions)
 correct = 0
@@ -31,26 +32,16 @@ for qid, question in islice(questions.items(), 0, num_questions):
         num_questions = num_questions - 1
         continue
 
-    ctl = Control()
-    ctl.add(theory)
-
     scene_encoding, question_encoding = encode_sample(question)
-    ctl.add(scene_encoding)
-    ctl.add(question_encoding)
-
-    answers = [[]]
-    def on_model(model):
-        answers[0] = [s.arguments[0].name for s in model.symbols(shown=True)]
-
-    ctl.ground()
-    result = ctl.solve(on_model=on_model)
+    solution = session.solve(scene_encoding, question_encoding)
+    answers = solution["answers"]
 
-    if result.satisfiable:
-        if(answer_is_correct(answers[0], question['answer'])):
+    if solution["satisfiable"]:
+        if(answer_is_correct(answers, question['answer'])):
             # print(f"Correct answer: {answer[0]}")
             correct = correct + 1
         else: 
-            print(f"Question {qid}: incorrect answer: {answers[0]} (correct: {question['answer']})")
+            print(f"Question {qid}: incorrect answer: {answers} (correct: {question['answer']})")
             incorrect = incorrect + 1
     else: 
         print(f"Question {qid}: UNSAT")
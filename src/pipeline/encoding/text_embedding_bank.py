@@ -0,0 +1,109 @@
+import json
+import os
+import numpy as np
+import torch
+from pipeline.encoding.scene_encoding import get_object_prompt, get_attribute_prompt
+from pipeline.utils import cleanup_whitespace
+
+
+class TextEmbeddingBank:
+    def __init__(self, model, bank_dir="../data/text_embedding_banks"):
+        self.model = model
+        # every model version (e.g. a fine-tuned snapshot) gets its own bank
+        self.path = f"{bank_dir}/{cleanup_whitespace(model.version)}"
+        self.prompt_indices = {}
+        self.embeddings = None
+        self.overflow = {}
+
+        if os.path.isfile(f"{self.path}/prompts.json"):
+            with open(f"{self.path}/prompts.json") as f:
+                self.prompt_indices = {prompt: i for i, prompt in enumerate(json.load(f))}
+            self.embeddings = np.load(f"{self.path}/embeddings.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self.prompt_indices) + len(self.overflow)
+
+    def __contains__(self, prompt):
+        return prompt in self.prompt_indices or prompt in self.overflow
+
+    @torch.no_grad()
+    def extend(self, prompts, batch_size=1024):
+        # prompts that are not part of the bank (e.g. relation prompts) are encoded once and kept in memory
+        prompts = [p for p in dict.fromkeys(prompts) if p not in self]
+        for i in range(0, len(prompts), batch_size):
+            batch = prompts[i:i+batch_size]
+            for prompt, features in zip(batch, self.model.get_text_features(batch).float().cpu()):
+                self.overflow[prompt] = features
+
+    def get_text_features(self, texts):
+        self.extend(texts)
+
+        bank_positions = [i for i, t in enumerate(texts) if t in self.prompt_indices]
+        overflow_positions = [i for i, t in enumerate(texts) if t not in self.prompt_indices]
+        dim = self.embeddings.shape[1] if self.embeddings is not None else next(iter(self.overflow.values())).shape[0]
+
+        text_features = torch.empty((len(texts), dim), dtype=torch.float32)
+        if len(bank_positions) > 0:
+            # fancy indexing only reads the needed rows of the memory-mapped bank
+            text_features[bank_positions] = torch.from_numpy(np.asarray(self.embeddings[[self.prompt_indices[texts[i]] for i in bank_positions]]))
+        if len(overflow_positions) > 0:
+            text_features[overflow_positions] = torch.stack([self.overflow[texts[i]] for i in overflow_positions])
+
+        return text_features.to(self.model.gpu)
+
+    def save(self):
+        # merge everything encoded on the fly into the on-disk bank
+        if len(self.overflow) == 0:
+            return
+
+        prompts = [*self.prompt_indices.keys(), *self.overflow.keys()]
+        overflow_embeddings = torch.stack(list(self.overflow.values())).numpy()
+        embeddings = overflow_embeddings if self.embeddings is None else np.concatenate([self.embeddings, overflow_embeddings])
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        np.save(f"{self.path}/embeddings.tmp.npy", embeddings)
+        os.replace(f"{self.path}/embeddings.tmp.npy", f"{self.path}/embeddings.npy")
+        with open(f"{self.path}/prompts.json", "w") as f:
+            json.dump(prompts, f)
+
+        self.prompt_indices = {prompt: i for i, prompt in enumerate(prompts)}
+        self.embeddings = np.load(f"{self.path}/embeddings.npy", mmap_mode="r")
+        self.overflow = {}
+
+
+def get_vocabulary_prompts(all_child_classes, all_attributes):
+    values = list(dict.fromkeys(val for vals in all_attributes.values() for val in vals))
+    return [
+        *(get_object_prompt(name) for name in all_child_classes),
+        *(get_attribute_prompt(val, name) for name in all_child_classes for val in values)
+    ]
+
+
+if __name__ == '__main__':
+    import argparse
+    import itertools
+    from model.clip_model import CLIPModel
+
+    parser = argparse.ArgumentParser(description="Build the text embedding bank for the closed GQA class/attribute vocabulary")
+    parser.add_argument("--model", default="openai/clip-vit-base-patch32")
+    parser.add_argument("--snapshot", default=None)
+    parser.add_argument("--bank-dir", default="../data/text_embedding_banks")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    with open('../data/metadata/gqa_all_attribute.json') as f:
+        all_attributes = json.load(f)
+
+    with open('../data/metadata/gqa_all_class.json') as f:
+        all_classes = json.load(f)
+        all_child_classes = [c.replace("_", " ") for c in itertools.chain(*all_classes.values())]
+
+    gpu = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
+    model = CLIPModel(gpu, model=args.model, snapshot=args.snapshot)
+
+    bank = TextEmbeddingBank(model, bank_dir=args.bank_dir)
+    prompts = get_vocabulary_prompts(all_child_classes, all_attributes)
+    print(f"encoding {len(prompts)} prompts into {bank.path}")
+    bank.extend(prompts, batch_size=args.batch_size)
+    bank.save()
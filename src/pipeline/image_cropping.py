@@ -0,0 +1,48 @@
+from torchvision.ops import roi_align
+import numpy as np
+import torch
+
+
+def get_crop_rois(bboxes, img_size, mode="pad"):
+    # (x1, y1, x2, y2) regions that roi_align samples for every (y1, x1, y2, x2) box, plus the masks of the pixels that
+    # belong to the crop (the rest is padding)
+    bboxes = torch.as_tensor(np.asarray(bboxes, dtype=np.float64).reshape(-1, 4))
+
+    # same integer crop rectangles as the per box crop, resize and pad that this replaced (int() of y, x, h and w)
+    y, x = bboxes[:, 0].trunc(), bboxes[:, 1].trunc()
+    h, w = (bboxes[:, 2] - bboxes[:, 0]).trunc().clamp(min=1), (bboxes[:, 3] - bboxes[:, 1]).trunc().clamp(min=1)
+
+    if mode == "pad":
+        # resize and scale (maintain aspect ratio), then pad to square dimensions
+        resize_h = torch.where(h > w, torch.full_like(h, img_size), 2*torch.round(img_size*h/w/2))
+        resize_w = torch.where(h > w, 2*torch.round(img_size*w/h/2), torch.full_like(w, img_size))
+    elif mode == "scale":
+        # resize and scale the image to the target dimensions
+        resize_h, resize_w = torch.full_like(h, img_size), torch.full_like(w, img_size)
+    else:
+        raise RuntimeError("Unsupported image processing mode!")
+
+    # the region is extended by the padding, so that the crop itself lands in the centered resize_h x resize_w window
+    pad_y, pad_x = (img_size - resize_h)//2, (img_size - resize_w)//2
+    scale_y, scale_x = h / resize_h, w / resize_w
+    y1, x1 = y - pad_y*scale_y, x - pad_x*scale_x
+    rois = torch.stack([x1, y1, x1 + img_size*scale_x, y1 + img_size*scale_y], dim=1)
+
+    pixels = torch.arange(img_size, dtype=torch.float64)
+    mask_y = (pixels[None] >= pad_y[:, None]) & (pixels[None] < (pad_y + resize_h)[:, None])
+    mask_x = (pixels[None] >= pad_x[:, None]) & (pixels[None] < (pad_x + resize_w)[:, None])
+    return rois, mask_y[:, :, None] & mask_x[:, None, :]
+
+
+def crop_images(image, bboxes, model, mode="pad"):
+    # all boxes of an image are cropped, resized and padded in a single roi_align on the device, the result is a
+    # normalized (N x 3 x img_size x img_size) batch that the models take without their image processors
+    rois, masks = get_crop_rois(bboxes, model.img_size, mode)
+    image = image.to(model.gpu, non_blocking=True)[None].float()
+
+    crops = roi_align(image, [rois.to(image)], output_size=model.img_size, sampling_ratio=-1, aligned=True)
+    crops = crops * masks[:, None].to(crops.device)
+
+    mean = torch.tensor(model.image_mean, device=crops.device)[None, :, None, None]
+    std = torch.tensor(model.image_std, device=crops.device)[None, :, None, None]
+    return (crops / 255 - mean) / std
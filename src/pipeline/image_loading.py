@@ -0,0 +1,62 @@
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from torchvision.io import read_file, decode_image, decode_jpeg, ImageReadMode
+import torch
+
+
+class ImageLoader:
+    # decodes the images of upcoming questions on background threads and keeps the last max_images decoded images,
+    # so that questions about the same image do not decode it again
+    def __init__(self, image_path, max_images=64, num_threads=4, device=None):
+        self.image_path = image_path
+        self.max_images = max_images
+        self.executor = ThreadPoolExecutor(max_workers=num_threads)
+        self.images = OrderedDict()
+
+        # JPEGs are decoded by nvjpeg directly into device memory if a CUDA device is given
+        self.device = device if device is not None and torch.device(device).type == "cuda" else None
+
+    def __load__(self, image_id):
+        data = read_file(f"{self.image_path}/{image_id}.jpg")
+        if self.device is not None:
+            return decode_jpeg(data, mode=ImageReadMode.RGB, device=self.device)
+        return decode_image(data, mode=ImageReadMode.RGB)
+
+    def prefetch(self, image_ids):
+        for image_id in image_ids:
+            if image_id not in self.images:
+                self.images[image_id] = self.executor.submit(self.__load__, image_id)
+            self.images.move_to_end(image_id)
+
+        while len(self.images) > self.max_images:
+            self.images.popitem(last=False)
+
+    def get(self, image_id):
+        self.prefetch([image_id])
+        return self.images[image_id].result()
+
+    def prefetch_stream(self, questions, lookahead=32):
+        # passes the questions through, while the images of the next lookahead questions are already being decoded
+        # (lookahead should stay below max_images, otherwise prefetched images are evicted before they are used)
+        upcoming = deque()
+        for question in questions:
+            self.prefetch([question["imageId"]])
+            upcoming.append(question)
+            if len(upcoming) > lookahead:
+                yield upcoming.popleft()
+
+        while len(upcoming) > 0:
+            yield upcoming.popleft()
+
+    def shutdown(self):
+        # images that were prefetched but are not decoding yet are cancelled (shutdown's cancel_futures needs Python 3.9)
+        for future in self.images.values():
+            future.cancel()
+        self.images.clear()
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
@@ -0,0 +1,69 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class StageTimer:
+    # wall-clock seconds and counts of the pipeline stages of one question, stages can be nested (a stage includes the
+    # time of the stages inside it) and entered repeatedly (their times add up)
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def add(self, other, share=1.0):
+        # e.g. the share of a question in the stages that ran for its whole batch
+        for name, seconds in other.seconds.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds*share
+        for name, n in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + n*share
+
+    def to_row(self):
+        return {
+            **{f"{name}_sec": seconds for name, seconds in self.seconds.items()},
+            **{f"num_{name}": n for name, n in self.counts.items()}
+        }
+
+
+__active_timer__ = ContextVar("active_timer", default=None)
+
+
+@contextmanager
+def recording(timer):
+    # stages and counts of the code inside (in this thread) go to timer, None keeps the current timer
+    if timer is None:
+        yield __active_timer__.get()
+        return
+
+    token = __active_timer__.set(timer)
+    try:
+        yield timer
+    finally:
+        __active_timer__.reset(token)
+
+
+@contextmanager
+def stage(name):
+    # times the code inside (or, as decorator, the function) if a timer is recording, otherwise does nothing
+    timer = __active_timer__.get()
+    if timer is None:
+        yield
+    else:
+        with timer.stage(name):
+            yield
+
+
+def count(name, n=1):
+    timer = __active_timer__.get()
+    if timer is not None:
+        timer.count(name, n)
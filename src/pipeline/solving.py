@@ -0,0 +1,132 @@
+from clingo.control import Control
+from clingo.ast import parse_string, ProgramBuilder
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import time
+
+
+class WeakConstraintCounter:
+    # clingo observer that counts the ground weak constraints, i.e. the literals of all minimize statements
+    def __init__(self):
+        self.num_weak_constraints = 0
+
+    def minimize(self, priority, literals):
+        self.num_weak_constraints += len(literals)
+
+
+def get_solver_statistics(ctl, counter, model_times, solve_start):
+    # grounding size and search effort of the last solve call, the times are seconds since the start of solving
+    statistics = ctl.statistics
+    return {
+        "num_atoms": int(statistics["problem"]["lp"]["atoms"]),
+        "num_rules": int(statistics["problem"]["lp"]["rules"]),
+        "num_weak_constraints": counter.num_weak_constraints,
+        "num_choices": int(statistics["solving"]["solvers"]["choices"]),
+        "num_conflicts": int(statistics["solving"]["solvers"]["conflicts"]),
+        # every model of the optimization is better than the one before
+        "num_optimization_steps": len(model_times),
+        "first_model_sec": model_times[0] - solve_start if len(model_times) > 0 else None,
+        "optimum_sec": model_times[-1] - solve_start if len(model_times) > 0 and statistics["summary"]["exhausted"] > 0 else None
+    }
+
+
+class SolverSession:
+    def __init__(self, theory, timeout=10.0):
+        self.timeout = timeout
+
+        # the theory is only parsed once, every question's control gets the already parsed statements
+        self.theory = []
+        parse_string(theory, self.theory.append)
+
+    def __create_control__(self):
+        ctl = Control()
+        with ProgramBuilder(ctl) as builder:
+            for statement in self.theory:
+                builder.add(statement)
+        return ctl
+
+    def solve(self, scene_encoding, question_encoding, timeout=None):
+        # only the scene and question encoding are parsed anew, the whole program including the theory is still grounded
+        # for every question, since all rules of the theory join over the question's facts and a part that clingo
+        # grounded before could not derive anything from facts added afterwards
+        start = time.time()
+        ctl = self.__create_control__()
+        counter = WeakConstraintCounter()
+        ctl.register_observer(counter)
+        for encoding in [scene_encoding, question_encoding]:
+            # encodings are either ASP text or AspPrograms, which are added through the backend without parsing
+            if isinstance(encoding, str):
+                ctl.add(encoding)
+            else:
+                encoding.add_to(ctl)
+
+        answers = [[]]
+        model_times = []
+        def on_model(model):
+            model_times.append(time.time())
+            answers[0] = [s.arguments[0].name for s in model.symbols(shown=True)]
+
+        ctl.ground()
+        ground_end = time.time()
+
+        with ctl.solve(on_model=on_model, async_=True) as handle:
+            has_finished = handle.wait(timeout if timeout is not None else self.timeout)
+            if not has_finished:
+                handle.cancel()
+            # whether a model was found, which a model without shown (answer) atoms also counts as
+            satisfiable = bool(handle.get().satisfiable)
+        end = time.time()
+
+        return {
+            "answers": answers[0],
+            "satisfiable": satisfiable,
+            "timeout": not has_finished,
+            "ground_sec": ground_end - start,
+            "solve_sec": end - ground_end,
+            "statistics": get_solver_statistics(ctl, counter, model_times, ground_end)
+        }
+
+
+def solve_encodings(theory, scene_encoding, question_encoding, timeout=10.0):
+    return SolverSession(theory, timeout).solve(scene_encoding, question_encoding)
+
+
+# sessions of the current worker process, the pool's theory is parsed once when the worker starts
+__worker_sessions__ = {}
+__worker_theory__ = None
+
+def __init_worker__(theory):
+    global __worker_theory__
+    __worker_theory__ = theory
+    __worker_sessions__[theory] = SolverSession(theory)
+
+def __solve_job__(scene_encoding, question_encoding, timeout, theory):
+    theory = theory if theory is not None else __worker_theory__
+    if theory not in __worker_sessions__:
+        __worker_sessions__[theory] = SolverSession(theory)
+    return __worker_sessions__[theory].solve(scene_encoding, question_encoding, timeout)
+
+
+class SolverPool:
+    def __init__(self, theory, num_workers=None, timeout=10.0):
+        self.timeout = timeout
+        # spawn instead of fork, the parent process usually holds an initialized GPU context
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers, 
+            mp_context=multiprocessing.get_context("spawn"), 
+            initializer=__init_worker__, 
+            initargs=(theory,)
+        )
+
+    def submit(self, scene_encoding, question_encoding, theory=None, timeout=None):
+        # returns a future of the solve_encodings result, the pool's theory is used unless another one is given
+        return self.executor.submit(__solve_job__, scene_encoding, question_encoding, timeout if timeout is not None else self.timeout, theory)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
@@ -1,7 +1,10 @@
-from pattern.text.en import singularize
 import re
 
 def sanitize(name):
+    # pattern is only imported once a name is sanitized, its first import downloads the nltk wordnet corpora if they are
+    # missing, which modules that only use cleanup_whitespace should not depend on
+    from pattern.text.en import singularize
+
     # source: DFOL-VQA
     plurale_tantum = ['this', 'yes', 'pants', 'shorts', 'glasses', 'scissors', 'panties', 'trousers', 'binoculars', 'pliers', 'tongs',\
         'tweezers', 'forceps', 'goggles', 'jeans', 'tights', 'leggings', 'chaps', 'boxers', 'indoors', 'outdoors', 'bus', 'octapus', 'waitress',\
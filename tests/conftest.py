@@ -0,0 +1,78 @@
+import os
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+# the modules are imported from src, like the scripts that are run from there, and pattern from externals
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../externals")))
+
+from benchmark.synthetic import make_vocabulary, make_questions, SyntheticImageLoader, SyntheticObjectDetector
+
+
+def stable_prob(*key):
+    # a probability that only depends on the key, the same in every run and for every subset of the scene
+    return 0.01 + 0.98 * zlib.crc32(repr(key).encode()) / 2**32
+
+
+def add_stable_probs(scene, all_attributes):
+    # probabilities in place of the VLM scores that only depend on the (box, name) of the objects, so that scenes
+    # with different subsets of the same detections get the same probabilities for the same objects
+    objects = scene["objects"].to_objects()
+    keys = [(tuple(round(o[k], 6) for k in ["x", "y", "w", "h"]), o["name"]) for o in objects]
+    values = [val for attr in scene["attributes"] for val in all_attributes.get(attr, [])]
+
+    def probs(rows):
+        rows = np.array(rows, dtype=np.float64).reshape(len(rows), -1)
+        return [rows.tolist(), (1 - rows).tolist()]
+
+    if "attr_objects" in scene:
+        if len(scene["attributes"]) > 0:
+            scene["attr_probs"] = probs([[stable_prob(keys[o], val) for val in values] for o in scene["attr_objects"]])
+        if len(scene["standalone_values"]) > 0:
+            scene["standalone_probs"] = probs([[stable_prob(keys[o], val) for val in scene["standalone_values"]] for o in scene["attr_objects"]])
+    if "rel_pairs" in scene:
+        scene["rel_probs"] = probs([[stable_prob(keys[o1], rel, keys[o2]) for rel in scene["relations"]] for o1, o2 in scene["rel_pairs"]])
+    return scene
+
+
+@pytest.fixture(scope="session")
+def theory():
+    with open(f"{SRC_DIR}/pipeline/encoding/theory.lp") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="session")
+def vocabulary():
+    return make_vocabulary(num_categories=4, num_classes=16, num_attributes=4, num_values=4, num_relations=6)
+
+
+@pytest.fixture(scope="session")
+def perception(vocabulary):
+    # synthetic questions of every operator mix with the detector and images of their scene graphs
+    rng = np.random.default_rng(0)
+    questions = [q for operator_mix in ["attribute", "relation", "logical", "comparison"] for q in make_questions(6, 6, operator_mix, vocabulary, rng)]
+    all_child_classes = [c.replace("_", " ") for classes in vocabulary["all_classes"].values() for c in classes]
+    return {
+        "questions": questions,
+        "object_detector": SyntheticObjectDetector(questions),
+        "image_loader": SyntheticImageLoader(questions),
+        "all_child_classes": all_child_classes
+    }
+
+
+@pytest.fixture(scope="session")
+def prepare(vocabulary, perception):
+    # prepare_scene with the synthetic detector and images, scored with stable probabilities
+    from pipeline.encoding.scene_encoding import prepare_scene
+
+    def prepare(question, lazy=False):
+        scene = prepare_scene(
+            question, perception["object_detector"], vocabulary["all_classes"], perception["all_child_classes"],
+            vocabulary["all_attributes"], None, perception["image_loader"], lazy
+        )
+        return add_stable_probs(scene, vocabulary["all_attributes"])
+    return prepare
@@ -0,0 +1,51 @@
+import pytest
+import torch
+
+from model.base_model import BaseModel
+
+
+class FeatureModel(BaseModel):
+    # a model whose images and texts are already their features, to score features through BaseModel.score
+    def __init__(self, logit_scale=1.0):
+        super().__init__(img_size=32, gpu=torch.device("cpu"), version="features")
+        self.logit_scale = logit_scale
+
+    def preprocess_images(self, images):
+        return images
+
+    def preprocess_texts(self, texts):
+        return texts
+
+    def get_image_features(self, images):
+        return images
+
+    def get_text_features(self, texts):
+        return texts
+
+    def get_logit_scale(self):
+        return self.logit_scale
+
+
+@pytest.mark.parametrize("logit_scale", [1.0, 100.0])
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+def test_paired_scores_match_diagonal(logit_scale, dtype):
+    model = FeatureModel(logit_scale)
+    generator = torch.Generator().manual_seed(0)
+    image_features = torch.randn((7, 16), generator=generator, dtype=dtype)
+    text_features = torch.randn((7, 16), generator=generator, dtype=dtype)
+
+    paired_scores = model.score_features_paired(image_features, text_features[:, None])
+    assert paired_scores.shape == (7, 1)
+    torch.testing.assert_close(paired_scores[:, 0], model.score(image_features, text_features).diag())
+
+
+@pytest.mark.parametrize("num_texts", [1, 3])
+def test_paired_scores_match_diagonal_blocks(num_texts):
+    # every image is scored against its own block of texts, the diagonal blocks of the full score matrix
+    model = FeatureModel(100.0)
+    generator = torch.Generator().manual_seed(num_texts)
+    image_features = torch.randn((5, 16), generator=generator)
+    text_features = torch.randn((5, num_texts, 16), generator=generator)
+
+    scores = model.score(image_features, text_features.reshape(-1, 16)).reshape(5, 5, num_texts)
+    torch.testing.assert_close(model.score_features_paired(image_features, text_features), scores[torch.arange(5), torch.arange(5)])
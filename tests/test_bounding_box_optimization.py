@@ -0,0 +1,126 @@
+from math import tanh
+
+import numpy as np
+import pytest
+
+from benchmark.synthetic import make_scene_graph, make_detections
+from object_detection.detections import LabelVocabulary
+from pipeline.bounding_box_optimization import get_object_bboxes, get_pair_bboxes, merge_box_array, merge_boxes
+
+
+# the loop implementations that the vectorized ones replaced, as reference
+
+def baseline_get_object_bboxes(objects, img_size, padding_scale_ceiling=1):
+    img_width = img_size['w'] - 1
+    img_height = img_size['h'] - 1
+
+    bboxes = []
+    for object in objects:
+        padding_w = (1 - tanh(object['w'] / img_width * 2)) * padding_scale_ceiling * object['w']
+        padding_h = (1 - tanh(object['h'] / img_height * 2)) * padding_scale_ceiling * object['h']
+        bboxes.append((
+            max(object['y'] - padding_h, 0),
+            max(object['x'] - padding_w, 0),
+            min(object['y']+object['h']+padding_h, img_height),
+            min(object['x']+object['w']+padding_h, img_width)
+        ))
+    return bboxes
+
+
+def baseline_should_merge(box1, box2, overlap_threshold):
+    YA1, XA1, YA2, XA2 = box1
+    YB1, XB1, YB2, XB2 = box2
+    box1_area = (YA2 - YA1) * (XA2 - XA1)
+    box2_area = (YB2 - YB1) * (XB2 - XB1)
+    intersection_area = max(0, min(XA2, XB2) - max(XA1, XB1)) * max(0, min(YA2, YB2) - max(YA1, YB1))
+    union_area = box1_area + box2_area - intersection_area
+
+    if intersection_area / union_area > overlap_threshold:
+        return True, (min(box1[0], box2[0]), min(box1[1], box2[1]), max(box1[2], box2[2]), max(box1[3], box2[3]))
+    return False, None
+
+
+def baseline_merge_boxes(boxes, overlap_threshold):
+    boxes = list(boxes)
+    for k in range(len(boxes)):
+        indices1, box1 = boxes[k]
+        for l in range(k+1, len(boxes)):
+            indices2, box2 = boxes[l]
+            is_merge, new_box = baseline_should_merge(box1, box2, overlap_threshold)
+            if is_merge:
+                boxes[k] = None
+                boxes[l] = (indices1.union(indices2), new_box)
+                break
+    return [b for b in boxes if b]
+
+
+def baseline_get_pair_bboxes(objects, merge_threshold=0.7):
+    num_objects = len(objects)
+    bbox_indices = np.full([num_objects, num_objects], -1)
+
+    joined_bboxes = []
+    for i in range(num_objects):
+        for j in range(i+1, num_objects):
+            object1, object2 = objects[i], objects[j]
+            joined_bboxes.append(({(i, j)}, (
+                min(object1['y'], object2['y']),
+                min(object1['x'], object2['x']),
+                max(object1['y'] + object1['h'], object2['y'] + object2['h']),
+                max(object1['x'] + object1['w'], object2['x'] + object2['w']),
+            )))
+
+    merged_boxes = baseline_merge_boxes(joined_bboxes, merge_threshold)
+    for k, (indices, _) in enumerate(merged_boxes):
+        for i, j in indices:
+            bbox_indices[i, j] = k
+            bbox_indices[j, i] = k
+    return [box for _, box in merged_boxes], bbox_indices
+
+
+def get_detections(vocabulary, num_objects, seed):
+    rng = np.random.default_rng(seed)
+    return make_detections(make_scene_graph(num_objects, vocabulary, rng), LabelVocabulary(), rng)
+
+
+@pytest.mark.parametrize("num_objects", [0, 1, 2, 5, 12, 25])
+@pytest.mark.parametrize("seed", range(3))
+def test_object_bboxes_match_baseline(vocabulary, num_objects, seed):
+    detections = get_detections(vocabulary, num_objects, seed)
+    img_size = {"w": 640, "h": 480}
+
+    bboxes = get_object_bboxes(detections, img_size)
+    assert bboxes.shape == (len(detections), 4)
+    np.testing.assert_allclose(bboxes.reshape(-1, 4), np.array(baseline_get_object_bboxes(detections.to_objects(), img_size)).reshape(-1, 4))
+
+
+@pytest.mark.parametrize("num_objects", [0, 1, 2, 5, 12, 25])
+@pytest.mark.parametrize("merge_threshold", [0.6, 0.7])
+@pytest.mark.parametrize("seed", range(3))
+def test_pair_bboxes_match_baseline(vocabulary, num_objects, merge_threshold, seed):
+    detections = get_detections(vocabulary, num_objects, seed)
+
+    bboxes, bbox_indices = get_pair_bboxes(detections, merge_threshold)
+    baseline_bboxes, baseline_bbox_indices = baseline_get_pair_bboxes(detections.to_objects(), merge_threshold)
+
+    np.testing.assert_allclose(np.array(bboxes).reshape(-1, 4), np.array(baseline_bboxes).reshape(-1, 4))
+    np.testing.assert_array_equal(bbox_indices, baseline_bbox_indices)
+
+
+@pytest.mark.parametrize("num_boxes", [1, 2, 10, 60])
+@pytest.mark.parametrize("overlap_threshold", [0.3, 0.7])
+def test_merge_box_array_matches_baseline(num_boxes, overlap_threshold):
+    # clusters of heavily overlapping boxes, so that boxes are merged repeatedly
+    rng = np.random.default_rng(num_boxes)
+    centers = rng.uniform(0, 400, (max(1, num_boxes // 4), 2))[rng.integers(0, max(1, num_boxes // 4), num_boxes)]
+    y1x1 = centers + rng.normal(0, 5, (num_boxes, 2))
+    boxes = np.concatenate([y1x1, y1x1 + rng.uniform(40, 80, (num_boxes, 2))], axis=1)
+
+    merged_boxes, box_indices = merge_box_array(boxes, overlap_threshold)
+    baseline_merged = baseline_merge_boxes([({k}, tuple(box)) for k, box in enumerate(boxes.tolist())], overlap_threshold)
+
+    np.testing.assert_allclose(merged_boxes, np.array([box for _, box in baseline_merged]).reshape(-1, 4))
+    for m, (indices, _) in enumerate(baseline_merged):
+        assert all(box_indices[k] == m for k in indices)
+
+    # the set based wrapper gives the same groups as the baseline
+    assert [indices for indices, _ in merge_boxes([({k}, tuple(box)) for k, box in enumerate(boxes.tolist())], overlap_threshold)] == [indices for indices, _ in baseline_merged]
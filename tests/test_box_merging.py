@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from benchmark.synthetic import make_vocabulary, make_scene_graph, make_detections
+from object_detection.box_merging import CategoryIndex, merge_overlapping_objects
+from object_detection.detections import Detections, LabelVocabulary
+from pipeline.encoding.scene_encoding import merge_detected_objects
+
+
+# the list of dict implementations that the tensor based ones replaced, as reference
+
+def baseline_should_merge(box1, box2, overlap_threshold):
+    YA1, XA1, YA2, XA2 = box1
+    YB1, XB1, YB2, XB2 = box2
+    box1_area = (YA2 - YA1) * (XA2 - XA1)
+    box2_area = (YB2 - YB1) * (XB2 - XB1)
+    intersection_area = max(0, min(XA2, XB2) - max(XA1, XB1)) * max(0, min(YA2, YB2) - max(YA1, YB1))
+    union_area = box1_area + box2_area - intersection_area
+
+    if intersection_area / union_area > overlap_threshold:
+        return True, (min(box1[0], box2[0]), min(box1[1], box2[1]), max(box1[2], box2[2]), max(box1[3], box2[3]))
+    return False, None
+
+
+def baseline_merge_objects(objects, overlap_threshold):
+    objects = list(objects)
+    for k in range(len(objects)):
+        object1 = objects[k]
+        for l in range(k+1, len(objects)):
+            object2 = objects[l]
+            if object1["name"] == object2["name"]:
+                is_merge, new_box = baseline_should_merge(
+                    (object1['y'], object1['x'], object1['y']+object1['h'], object1['x']+object1['w']),
+                    (object2['y'], object2['x'], object2['y']+object2['h'], object2['x']+object2['w']), overlap_threshold
+                )
+                if is_merge:
+                    objects[k] = None
+                    objects[l] = {
+                        "y": new_box[0], "x": new_box[1], "h": new_box[2]-new_box[0], "w": new_box[3]-new_box[1],
+                        "name": object1["name"], "score": max(object1["score"], object2["score"])
+                    }
+                    break
+    return [o for o in objects if o]
+
+
+def baseline_merge_detected_objects(objects_a, objects_b, all_classes):
+    objects = [*objects_a]
+    for ob in objects_b:
+        already_present = False
+        for oa in objects_a:
+            categories_a = {cat for cat in all_classes if oa["name"] in all_classes[cat]}
+            categories_b = {cat for cat in all_classes if ob["name"] in all_classes[cat]}
+            if len(categories_a & categories_b) > 0:
+                is_merge, _ = baseline_should_merge(
+                    (oa['y'], oa['x'], oa['y']+oa['h'], oa['x']+oa['w']),
+                    (ob['y'], ob['x'], ob['y']+ob['h'], ob['x']+ob['w']), overlap_threshold=0.7
+                )
+                if is_merge:
+                    already_present = True
+        if not already_present:
+            objects.append(ob)
+    return objects
+
+
+def baseline_top_k(objects, k):
+    return sorted(objects, key=lambda o: o["score"], reverse=True)[:k]
+
+
+def assert_same_objects(objects, baseline_objects):
+    assert [o["name"] for o in objects] == [o["name"] for o in baseline_objects]
+    for key in ["x", "y", "w", "h", "score"]:
+        np.testing.assert_allclose([o[key] for o in objects], [o[key] for o in baseline_objects], rtol=1e-12)
+
+
+@pytest.fixture(scope="module")
+def merge_vocabulary():
+    # few classes, so that many detections share their class, and detection names as they appear in all_classes
+    vocabulary = make_vocabulary(num_categories=3, num_classes=5, num_attributes=2, num_values=2, num_relations=2)
+    # one class in two categories, for detections that share a category through it
+    vocabulary["all_classes"]["category_1"].append("class_0")
+    vocabulary["all_classes"] = {category: [c.replace("_", " ") for c in classes] for category, classes in vocabulary["all_classes"].items()}
+    return vocabulary
+
+
+def get_detections(vocabulary, label_vocabulary, num_objects, seed, duplicate_rate=0.5):
+    rng = np.random.default_rng(seed)
+    return make_detections(make_scene_graph(num_objects, vocabulary, rng), label_vocabulary, rng, duplicate_rate=duplicate_rate, jitter=0.1)
+
+
+@pytest.mark.parametrize("num_objects", [0, 1, 2, 10, 40])
+@pytest.mark.parametrize("overlap_threshold", [0.3, 0.6])
+@pytest.mark.parametrize("seed", range(3))
+def test_merge_overlapping_objects_matches_baseline(merge_vocabulary, num_objects, overlap_threshold, seed):
+    detections = get_detections(merge_vocabulary, LabelVocabulary(), num_objects, seed, duplicate_rate=1.0)
+
+    merged = merge_overlapping_objects(detections, overlap_threshold)
+    assert_same_objects(merged.to_objects(), baseline_merge_objects(detections.to_objects(), overlap_threshold))
+
+
+@pytest.mark.parametrize("num_objects", [0, 1, 5, 20])
+@pytest.mark.parametrize("seed", range(3))
+def test_merge_detected_objects_matches_baseline(merge_vocabulary, num_objects, seed):
+    # the second detections are jittered copies of the first, as the detections of another class query
+    label_vocabulary = LabelVocabulary()
+    rng = np.random.default_rng(seed)
+    scene_graph = make_scene_graph(num_objects, merge_vocabulary, rng)
+    detections_a = make_detections(scene_graph, label_vocabulary, rng, duplicate_rate=0.0)
+    detections_b = make_detections(scene_graph, label_vocabulary, rng, duplicate_rate=1.0, jitter=0.2)
+    all_classes = merge_vocabulary["all_classes"]
+
+    merged = merge_detected_objects(detections_a, detections_b, all_classes, CategoryIndex(all_classes))
+    assert_same_objects(merged.to_objects(), baseline_merge_detected_objects(detections_a.to_objects(), detections_b.to_objects(), all_classes))
+
+
+@pytest.mark.parametrize("num_objects", [0, 1, 10, 40])
+@pytest.mark.parametrize("k", [1, 5, 100])
+def test_top_k_matches_baseline(merge_vocabulary, num_objects, k):
+    detections = get_detections(merge_vocabulary, LabelVocabulary(), num_objects, num_objects)
+    # coarse scores, so that ties have to keep the detection order like sorted does
+    detections = Detections(detections.boxes, (detections.scores * 4).round() / 4, detections.labels, detections.vocabulary)
+
+    assert_same_objects(detections.top_k(k).to_objects(), baseline_top_k(detections.to_objects(), k))
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+from torchvision.transforms.functional import crop, resize, pad
+
+from pipeline.bounding_box_optimization import get_object_bboxes, get_pair_bboxes
+from benchmark.synthetic import make_scene_graph, make_detections
+from object_detection.detections import LabelVocabulary
+from pipeline.image_cropping import crop_images
+
+
+# the per box crop, resize and pad that crop_images replaced, as reference
+
+def baseline_bboxes_to_image_crops(bboxes, image, model, mode="pad"):
+    bbox_crops = []
+    for bbox in bboxes:
+        y, x, h, w = int(bbox[0]), int(bbox[1]), int(bbox[2]-bbox[0]), int(bbox[3]-bbox[1])
+        bbox_crop = crop(image, y, x, h, w)
+
+        if mode == "pad":
+            # resize and scale (maintain aspect ratio)
+            if h > w:
+                resize_dimensions = (model.img_size, 2*round((model.img_size*w/h)/2))
+            else:
+                resize_dimensions = (2*round((model.img_size*h/w)/2), model.img_size)
+            bbox_crop = resize(bbox_crop, resize_dimensions, antialias=True)
+
+            # pad the image to square dimensions
+            bbox_crop = pad(bbox_crop, ((model.img_size - resize_dimensions[1])//2, (model.img_size - resize_dimensions[0])//2))
+
+        elif mode == "scale":
+            # resize and scale the image to the target dimensions
+            bbox_crop = resize(bbox_crop, (model.img_size, model.img_size), antialias=True)
+
+        bbox_crops.append(bbox_crop)
+
+    return bbox_crops
+
+
+def make_image(height, width):
+    # a smooth image whose values are all above 0, so that zeros in the reference crops are padding
+    y, x = torch.meshgrid(torch.arange(height, dtype=torch.float64), torch.arange(width, dtype=torch.float64), indexing="ij")
+    channels = [
+        128 + 100 * torch.sin(x / 37 + c) * torch.cos(y / 23 - c) + 20 * torch.sin((x + y) / 11 * (c + 1))
+        for c in range(3)
+    ]
+    return torch.stack(channels).clamp(1, 255).round().to(torch.uint8)
+
+
+@pytest.fixture(scope="module")
+def model():
+    return SimpleNamespace(img_size=64, gpu=torch.device("cpu"), image_mean=(0.48145466, 0.4578275, 0.40821073), image_std=(0.26862954, 0.26130258, 0.27577711))
+
+
+def get_bboxes(seed):
+    # padded object boxes and merged pair boxes of a synthetic scene, like the crops of score_scenes
+    rng = np.random.default_rng(seed)
+    vocabulary = {"all_classes": {"category_0": ["class_0"]}, "all_attributes": {}, "relations": ["relation 0"]}
+    detections = make_detections(make_scene_graph(6, vocabulary, rng), LabelVocabulary(), rng)
+    object_bboxes = get_object_bboxes(detections, {"w": 640, "h": 480})
+    pair_bboxes, _ = get_pair_bboxes(detections, merge_threshold=0.6)
+    return np.concatenate([object_bboxes, np.array(pair_bboxes).reshape(-1, 4)])
+
+
+@pytest.mark.parametrize("mode", ["pad", "scale"])
+@pytest.mark.parametrize("seed", range(3))
+def test_crops_match_baseline(model, mode, seed):
+    image = make_image(480, 640)
+    bboxes = get_bboxes(seed)
+
+    crops = crop_images(image, bboxes, model, mode)
+    baseline_crops = torch.stack(baseline_bboxes_to_image_crops(bboxes, image, model, mode)).to(torch.float32)
+    assert crops.shape == baseline_crops.shape == (len(bboxes), 3, model.img_size, model.img_size)
+
+    # the padding is in the same place
+    assert torch.equal((crops == crops.amin(dim=(2, 3), keepdim=True)).all(dim=1), (baseline_crops == 0).all(dim=1))
+
+    # bilinear sampling with adaptive averaging in place of antialiased resizing only changes the pixel values slightly
+    mean = torch.tensor(model.image_mean)[None, :, None, None]
+    std = torch.tensor(model.image_std)[None, :, None, None]
+    difference = (crops - (baseline_crops / 255 - mean) / std).abs()
+    assert difference.mean() < 0.015
+    assert torch.quantile(difference.flatten(), 0.99) < 0.08
+    assert difference.max() < 0.2
@@ -0,0 +1,82 @@
+import os
+import shutil
+from types import SimpleNamespace
+
+import pytest
+
+from model.inference_mode import InferenceMode
+from pipeline.encoding.perception_store import PerceptionStore, get_perception_key
+from pipeline.encoding.scene_encoding import build_scene_program, reencode_scenes
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_reencoded_scenes_match_encoding(tmp_path, vocabulary, perception, prepare, lazy):
+    all_classes, all_attributes = vocabulary["all_classes"], vocabulary["all_attributes"]
+    questions = perception["questions"]
+    scenes = [prepare(q, lazy) for q in questions]
+
+    store = PerceptionStore(str(tmp_path), "owlvit base+clip")
+    for q, scene in zip(questions, scenes):
+        store.save(q["qid"], scene)
+
+    # re-encoding without a perception key picks the only one in the store
+    encodings = reencode_scenes(questions, PerceptionStore(str(tmp_path)), all_classes, all_attributes)
+    assert encodings == [build_scene_program(scene, all_classes, all_attributes).to_text() for scene in scenes]
+
+    programs = reencode_scenes(questions, store, all_classes, all_attributes, as_program=True)
+    assert [program.to_text() for program in programs] == encodings
+
+
+def test_unscored_scene_roundtrip(tmp_path, vocabulary, perception, prepare):
+    # scenes without probabilities (e.g. no objects were detected) are stored and loaded without them
+    q = perception["questions"][0]
+    scene = prepare(q)
+    for key in ["attr_probs", "standalone_probs", "rel_probs"]:
+        scene.pop(key, None)
+
+    store = PerceptionStore(str(tmp_path), "v1")
+    store.save(q["qid"], scene)
+    loaded = store.load(q["qid"])
+    assert all(key not in loaded for key in ["attr_probs", "standalone_probs", "rel_probs"])
+    assert loaded["objects"].names == scene["objects"].names
+    assert loaded["image_size"] == scene["image_size"]
+
+
+def test_perception_keys(tmp_path):
+    model = SimpleNamespace(version="openai/clip-vit-base-patch32", inference_mode=InferenceMode())
+    detector = SimpleNamespace(cache_key="google/owlvit-base-patch32+torch+fp32")
+    other_detector = SimpleNamespace(cache_key="google/owlvit-base-patch32+onnx+fp32")
+
+    # results of another detector or of lazy and eager perception are kept apart
+    keys = {get_perception_key(model, detector, False), get_perception_key(model, detector, True), get_perception_key(model, other_detector, False)}
+    assert len(keys) == 3
+    assert len({PerceptionStore(str(tmp_path), key).path for key in keys}) == 3
+
+
+def test_mismatching_entry_is_rejected(tmp_path, perception, prepare):
+    q = perception["questions"][0]
+    store = PerceptionStore(str(tmp_path), "clip+fp32+owlvit+torch+fp32+eager")
+    store.save(q["qid"], prepare(q))
+    assert store.load(q["qid"])["image_id"] == q["imageId"]
+
+    # an entry that ended up under another key is not loaded
+    other_store = PerceptionStore(str(tmp_path), "clip+fp32+owlvit+torch+fp32+lazy")
+    shutil.copy(f"{store.path}/{q['qid']}.npz", f"{other_store.path}/{q['qid']}.npz")
+    assert q["qid"] in other_store
+    with pytest.raises(RuntimeError):
+        other_store.load(q["qid"])
+
+    os.remove(f"{other_store.path}/{q['qid']}.npz")
+    os.rmdir(other_store.path)
+    assert PerceptionStore(str(tmp_path)).load(q["qid"])["image_id"] == q["imageId"]
+
+
+def test_missing_question_and_key(tmp_path):
+    store = PerceptionStore(str(tmp_path), "v1")
+    assert "missing" not in store
+    with pytest.raises(RuntimeError):
+        store.load("missing")
+
+    PerceptionStore(str(tmp_path), "v2")
+    with pytest.raises(RuntimeError):
+        PerceptionStore(str(tmp_path))
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from benchmark.synthetic import make_questions, SyntheticImageLoader, SyntheticObjectDetector
+from conftest import add_stable_probs
+from pipeline.encoding import encode_question
+from pipeline.encoding.scene_encoding import prepare_scene, build_scene_program
+from pipeline.solving import SolverSession
+
+
+@pytest.mark.parametrize("num_objects", [1, 6, 12])
+def test_lazy_answers_match_eager(theory, vocabulary, perception, num_objects):
+    # the lazy perception only keeps the objects and pairs the question program reads, the answers stay the same
+    rng = np.random.default_rng(num_objects)
+    questions = perception["questions"] if num_objects == 6 else make_questions(20, num_objects, "mixed", vocabulary, rng)
+    object_detector = perception["object_detector"] if num_objects == 6 else SyntheticObjectDetector(questions)
+    image_loader = perception["image_loader"] if num_objects == 6 else SyntheticImageLoader(questions)
+    all_classes, all_attributes = vocabulary["all_classes"], vocabulary["all_attributes"]
+
+    session = SolverSession(theory, timeout=60)
+    for q in questions:
+        question_program = encode_question(q, as_program=True)
+        solutions = []
+        for lazy in [False, True]:
+            scene = prepare_scene(q, object_detector, all_classes, perception["all_child_classes"], all_attributes, None, image_loader, lazy)
+            scene = add_stable_probs(scene, all_attributes)
+            solutions.append(session.solve(build_scene_program(scene, all_classes, all_attributes), question_program))
+        eager, lazy = solutions
+
+        assert not eager["timeout"] and not lazy["timeout"]
+        assert (lazy["answers"], lazy["satisfiable"]) == (eager["answers"], eager["satisfiable"]), q["qid"]
+        assert lazy["statistics"]["num_atoms"] <= eager["statistics"]["num_atoms"], q["qid"]
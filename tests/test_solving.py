@@ -0,0 +1,68 @@
+import pytest
+from clingo.control import Control
+
+from pipeline.encoding import encode_question
+from pipeline.encoding.perfect_information_encoding import encode_scene, get_metadata_lookups
+from pipeline.encoding.scene_encoding import build_scene_program
+from pipeline.solving import SolverSession, SolverPool
+
+
+def baseline_solve(theory, scene_encoding, question_encoding):
+    # a fresh control per question that parses the theory, as before the solver sessions
+    ctl = Control()
+    ctl.add(theory)
+    ctl.add(scene_encoding)
+    ctl.add(question_encoding)
+    ctl.ground()
+
+    answers = []
+    def on_model(model):
+        answers[:] = [s.arguments[0].name for s in model.symbols(shown=True)]
+    result = ctl.solve(on_model=on_model)
+    return answers, bool(result.satisfiable)
+
+
+@pytest.fixture(scope="module")
+def encodings(vocabulary, perception, prepare):
+    # perfect information and detected scene encodings of every question, as text and as program
+    lookups = get_metadata_lookups(vocabulary["all_classes"], vocabulary["all_attributes"])
+    encodings = []
+    for q in perception["questions"]:
+        scene_program = build_scene_program(prepare(q), vocabulary["all_classes"], vocabulary["all_attributes"])
+        question_program = encode_question(q, as_program=True)
+        encodings.append((q["qid"], "perfect", encode_scene(q["sceneGraph"], lookups), question_program.to_text(), question_program))
+        encodings.append((q["qid"], "detected", scene_program.to_text(), question_program.to_text(), question_program, scene_program))
+    return encodings
+
+
+def test_session_matches_fresh_control(theory, encodings):
+    session = SolverSession(theory, timeout=60)
+    for qid, kind, scene_text, question_text, *_ in encodings:
+        solution = session.solve(scene_text, question_text)
+        assert not solution["timeout"]
+        assert (solution["answers"], solution["satisfiable"]) == baseline_solve(theory, scene_text, question_text), (qid, kind)
+
+
+def test_session_programs_match_text(theory, encodings):
+    session = SolverSession(theory, timeout=60)
+    for qid, kind, scene_text, question_text, question_program, *scene_program in encodings:
+        scene_encoding = scene_program[0] if len(scene_program) > 0 else scene_text
+        solution = session.solve(scene_encoding, question_program)
+        text_solution = session.solve(scene_text, question_text)
+        assert (solution["answers"], solution["satisfiable"]) == (text_solution["answers"], text_solution["satisfiable"]), (qid, kind)
+
+
+def test_session_reports_unsatisfiable(theory):
+    session = SolverSession(theory, timeout=60)
+    solution = session.solve("", ":- not impossible.")
+    assert solution["satisfiable"] is False
+    assert solution["answers"] == []
+    assert baseline_solve(theory, "", ":- not impossible.") == ([], False)
+
+
+def test_pool_matches_fresh_control(theory, encodings):
+    with SolverPool(theory, num_workers=2, timeout=60) as pool:
+        futures = [(qid, kind, scene_text, question_text, pool.submit(scene_text, question_text)) for qid, kind, scene_text, question_text, *_ in encodings[:8]]
+        for qid, kind, scene_text, question_text, future in futures:
+            solution = future.result()
+            assert (solution["answers"], solution["satisfiable"]) == baseline_solve(theory, scene_text, question_text), (qid, kind)